@@ -0,0 +1,99 @@
+import argparse
+import logging
+import os
+import requests
+import sys
+import time
+
+# Append parent directory to PYTHON_PATH so we can import utils.py
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from stats import Histogram
+
+import utils
+
+search_context_name = "ContextBenchmarkSearchContext"
+mask_context_name = "ContextBenchmarkMaskContext"
+
+
+# A search context with the given number of pattern matchers, and a mask context with one
+# rule and rule matcher for each of them.
+def contexts(matchers):
+  search_context = {
+    "name": search_context_name,
+    "matchers": [
+      {
+        "name": f"TestMatcher{i}",
+        "type": "pattern",
+        "pattern": f"test{i}"
+      } for i in range(matchers)
+    ]
+  }
+
+  mask_context = {
+    "name": mask_context_name,
+    "rules": [
+      {
+        "name": f"TestRule{i}",
+        "type": "cosort",
+        "expression": "enc_fp_aes256_alphanum(${NAME})"
+      } for i in range(matchers)
+    ],
+    "ruleMatchers": [
+      {
+        "name": f"TestNameRuleMatcher{i}",
+        "type": "name",
+        "rule": f"TestRule{i}",
+        "pattern": f"TestMatcher{i}"
+      } for i in range(matchers)
+    ]
+  }
+
+  return [
+    ("searchContext", search_context),
+    ("maskContext", mask_context)
+  ]
+
+
+def timed(function, *args):
+  start = time.perf_counter()
+  function(*args)
+  return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+  logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+  parser = argparse.ArgumentParser(description='Benchmark context creation and destruction.')
+  parser.add_argument('matchers', type=int,
+                      help='The max number of matchers and rules per context. Runs 1, 2, 4, ... up to this number.')
+  parser.add_argument('-i', '--iterations', metavar='N', type=int, default=10, help='The number of times each context should be created and destroyed. Defaults to 10.')
+
+  args = parser.parse_args()
+  levels = []
+  matchers = 1
+  while matchers < args.matchers:
+    levels.append(matchers)
+    matchers *= 2
+  levels.append(args.matchers)
+  results = []
+  with requests.Session() as session:
+    for matchers in levels:
+      definitions = contexts(matchers)
+      latencies = {}
+      for context, data in definitions:
+        latencies[f'{context}.create'] = Histogram()
+        latencies[f'{context}.destroy'] = Histogram()
+      for i in range(args.iterations):
+        for context, data in definitions:
+          latencies[f'{context}.create'].record(timed(utils.create_context, session, context, data))
+        for context, data in reversed(definitions):
+          latencies[f'{context}.destroy'].record(timed(utils.destroy_context, session, context, data['name']))
+      result = {'matchers': matchers, 'iterations': args.iterations}
+      result.update({name: histogram.summary() for name, histogram in latencies.items()})
+      results.append(result)
+      logging.info(f'{matchers} matchers: ' + ', '.join(
+        f'{name} mean {histogram.mean():.4f} p99 {histogram.percentile(99):.4f}'
+        for name, histogram in latencies.items()) + ' seconds')
+  utils.write_results('results/contexts', results)
@@ -0,0 +1,173 @@
+import itertools
+import json
+import os
+import random
+
+from xml.sax.saxutils import escape
+
+first_names = [
+  'JAMES', 'MARY', 'ROBERT', 'PATRICIA', 'JOHN', 'JENNIFER', 'MICHAEL', 'LINDA', 'DAVID', 'ELIZABETH',
+  'WILLIAM', 'BARBARA', 'RICHARD', 'SUSAN', 'JOSEPH', 'JESSICA', 'THOMAS', 'SARAH', 'CHARLES', 'KAREN',
+  'CHRISTOPHER', 'LISA', 'DANIEL', 'NANCY', 'MATTHEW', 'BETTY', 'ANTHONY', 'MARGARET', 'MARK', 'SANDRA'
+]
+last_names = [
+  'SMITH', 'JOHNSON', 'WILLIAMS', 'BROWN', 'JONES', 'GARCIA', 'MILLER', 'DAVIS', 'RODRIGUEZ', 'MARTINEZ',
+  'HERNANDEZ', 'LOPEZ', 'GONZALEZ', 'WILSON', 'ANDERSON', 'THOMAS', 'TAYLOR', 'MOORE', 'JACKSON', 'MARTIN',
+  'LEE', 'PEREZ', 'THOMPSON', 'WHITE', 'HARRIS', 'SANCHEZ', 'CLARK', 'RAMIREZ', 'LEWIS', 'ROBINSON'
+]
+domains = ['example.com', 'example.org', 'example.net', 'mail.example.com']
+words = [
+  'the', 'of', 'and', 'to', 'in', 'is', 'was', 'for', 'on', 'that', 'with', 'as', 'by', 'at', 'from',
+  'account', 'order', 'customer', 'record', 'report', 'payment', 'service', 'request', 'status', 'update',
+  'address', 'number', 'balance', 'review', 'policy', 'claim', 'invoice', 'date', 'amount', 'total',
+  'please', 'contact', 'received', 'processed', 'pending', 'approved', 'declined', 'shipped', 'returned',
+  'office', 'branch', 'department', 'manager', 'agent', 'system', 'note', 'comment', 'reference', 'item',
+  'product', 'quantity', 'price', 'discount', 'credit', 'debit', 'transfer', 'deposit', 'withdrawal',
+  'monthly', 'annual', 'quarterly', 'daily', 'new', 'old', 'open', 'closed', 'active', 'inactive'
+]
+pii_types = ['name', 'ssn', 'email']
+media_types = {
+  'txt': 'text/plain',
+  'csv': 'text/csv',
+  'json': 'application/json',
+  'xml': 'application/xml',
+  'parquet': 'application/x-parquet'
+}
+
+
+# Generates free text mixed with PII: names made of first_names and last_names, SSNs in the
+# ddd-dd-dddd form matched by the SsnMatcher pattern, and email addresses. Each token is PII
+# with probability hit_density, with the kind of PII drawn using pii_weights. The other
+# tokens are drawn from words with a Zipf (rank ^ -1) or uniform distribution. The same
+# seed always generates the same content, and the number of hits of each kind is counted.
+class Corpus():
+
+  def __init__(self, seed=0, hit_density=0.1, distribution='zipf', pii_weights=None):
+    self.random = random.Random(seed)
+    self.hit_density = hit_density
+    pii_weights = pii_weights or {}
+    self.pii_weights = list(itertools.accumulate(pii_weights.get(kind, 1) for kind in pii_types))
+    if distribution == 'zipf':
+      self.word_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    else:
+      self.word_weights = None
+    self.hits = {kind: 0 for kind in pii_types}
+
+  def name(self):
+    return f'{self.random.choice(first_names)} {self.random.choice(last_names)}'
+
+  def ssn(self):
+    r = self.random
+    return f'{r.randint(100, 899):03d}-{r.randint(1, 99):02d}-{r.randint(1, 9999):04d}'
+
+  def email(self):
+    r = self.random
+    return f'{r.choice(first_names).lower()}.{r.choice(last_names).lower()}{r.randint(1, 999)}@{r.choice(domains)}'
+
+  def token(self):
+    if self.random.random() < self.hit_density:
+      kind = self.random.choices(pii_types, cum_weights=self.pii_weights)[0]
+      self.hits[kind] += 1
+      return getattr(self, kind)()
+    if self.word_weights:
+      return self.random.choices(words, cum_weights=self.word_weights)[0]
+    return self.random.choice(words)
+
+  def text(self, tokens):
+    return ' '.join(self.token() for _ in range(tokens))
+
+  def record(self, fields, tokens):
+    return [self.text(tokens) for _ in range(fields)]
+
+  # Writes a set file of every name the corpus can generate, for use with a set matcher.
+  @staticmethod
+  def write_names(path):
+    with open(path, 'w') as f:
+      for first, last in itertools.product(first_names, last_names):
+        f.write(f'{first} {last}{os.linesep}')
+
+
+# Each writer writes records of 'fields' fields of 'tokens' tokens to path until the file
+# is at least size bytes, and returns the number of records written. Records are buffered
+# and written in blocks.
+def write_txt(corpus, path, size, fields=1, tokens=20, block=1000):
+  written = records = 0
+  with open(path, 'w') as f:
+    while written < size:
+      lines = [' '.join(corpus.record(fields, tokens)) + os.linesep for _ in range(block)]
+      data = ''.join(lines)
+      f.write(data)
+      written += len(data)
+      records += block
+  return records
+
+
+def write_csv(corpus, path, size, fields=5, tokens=4, block=1000):
+  with open(path, 'w') as f:
+    header = ','.join(f'field{i}' for i in range(fields)) + os.linesep
+    f.write(header)
+    written = len(header)
+    records = 0
+    while written < size:
+      data = ''.join(','.join(corpus.record(fields, tokens)) + os.linesep for _ in range(block))
+      f.write(data)
+      written += len(data)
+      records += block
+  return records
+
+
+def write_json(corpus, path, size, fields=5, tokens=4, block=1000):
+  names = [f'field{i}' for i in range(fields)]
+  with open(path, 'w') as f:
+    f.write(f'[{os.linesep}')
+    written = records = 0
+    while written < size:
+      objects = [json.dumps(dict(zip(names, corpus.record(fields, tokens)))) for _ in range(block)]
+      data = ('' if not records else f',{os.linesep}') + f',{os.linesep}'.join(objects)
+      f.write(data)
+      written += len(data)
+      records += block
+    f.write(f'{os.linesep}]{os.linesep}')
+  return records
+
+
+def write_xml(corpus, path, size, fields=5, tokens=4, block=1000):
+  with open(path, 'w') as f:
+    f.write(f'<?xml version="1.0" encoding="UTF-8"?>{os.linesep}<records>{os.linesep}')
+    written = records = 0
+    while written < size:
+      data = ''.join('<record>' + ''.join(f'<field{i}>{escape(value)}</field{i}>'
+                                          for i, value in enumerate(corpus.record(fields, tokens)))
+                     + f'</record>{os.linesep}' for _ in range(block))
+      f.write(data)
+      written += len(data)
+      records += block
+    f.write(f'</records>{os.linesep}')
+  return records
+
+
+# Parquet is columnar and compressed, so size is the amount of uncompressed text written.
+# Requires pyarrow.
+def write_parquet(corpus, path, size, fields=5, tokens=4, block=10000):
+  import pyarrow as pa
+  import pyarrow.parquet as pq
+  names = [f'field{i}' for i in range(fields)]
+  schema = pa.schema([(name, pa.string()) for name in names])
+  written = records = 0
+  with pq.ParquetWriter(path, schema) as writer:
+    while written < size:
+      rows = [corpus.record(fields, tokens) for _ in range(block)]
+      columns = [pa.array([row[i] for row in rows], pa.string()) for i in range(fields)]
+      writer.write_table(pa.Table.from_arrays(columns, names=names))
+      written += sum(len(value) for row in rows for value in row)
+      records += block
+  return records
+
+
+writers = {
+  'txt': write_txt,
+  'csv': write_csv,
+  'json': write_json,
+  'xml': write_xml,
+  'parquet': write_parquet
+}
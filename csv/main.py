@@ -1,4 +1,5 @@
 import argparse
+import itertools
 import json
 import logging
 import os
@@ -12,42 +13,99 @@ sys.path.append(parent_dir)
 
 from setup import setup, teardown, file_mask_context_name, file_search_context_name
 
+import generator
 import utils
 
+shape_options = ['columns', 'width', 'distribution', 'header', 'quoting', 'delimiter']
+shape_defaults = {
+  'columns': [10],
+  'width': [10],
+  'distribution': ['fixed'],
+  'header': [True],
+  'quoting': ['none'],
+  'delimiter': ['comma']
+}
+
+
+def list_of(parse, choices=None):
+  def parse_list(value):
+    items = value.split(',')
+    for item in items:
+      if choices and item not in choices:
+        raise argparse.ArgumentTypeError(f'invalid choice: {item} (choose from {", ".join(choices)})')
+    return [parse(item) for item in items]
+  return parse_list
+
+
+# Benchmarks every combination of the shape options at the same total size of 'lines' kbs,
+# since tokenizing and masking cost per cell as well as per byte.
+def benchmark_shapes(session, context, args):
+  values = [getattr(args, option) or shape_defaults[option] for option in shape_options]
+  rows = []
+  for shape in itertools.product(*values):
+    shape = dict(zip(shape_options, shape))
+    layout = generator.csv_shape_layout(args.lines, shape['columns'], shape['width'], shape['distribution'],
+                                        shape['header'], shape['quoting'],
+                                        generator.csv_delimiters[shape['delimiter']], seed=args.seed)
+    file_path = generator.cached('csv', args.lines, lambda path: generator.write_layout(path, layout),
+                                 seed=args.seed, **shape)
+    label = (f'{shape["columns"]}x{shape["width"]}-{shape["distribution"]}-header-{"on" if shape["header"] else "off"}'
+             f'-{shape["quoting"]}-{shape["delimiter"]}')
+    results = utils.benchmark_search_mask(session, file_path, context, f'{args.lines}/{label}', 'text/csv',
+                                          args.iterations, records=layout.records, **utils.benchmark_options(args))
+    row = dict(shape)
+    row.update({
+      'bytes': os.path.getsize(file_path),
+      'rows': layout.records,
+      'megabytesPerSecond': results['throughput']['megabytesPerSecond'],
+      'rowsPerSecond': results['throughput']['recordsPerSecond'],
+      'cellsPerSecond': results['throughput']['recordsPerSecond'] * shape['columns'],
+      'p50': results['latency']['p50'],
+      'p99': results['latency']['p99']
+    })
+    logging.info(f'{label}: {row["rowsPerSecond"]:.1f} rows/s, {row["megabytesPerSecond"]:.3f} MB/s.')
+    rows.append(row)
+  utils.write_results(f'results/{args.lines}', rows, 'shapes')
+
+
 if __name__ == '__main__':
   logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
   parser = argparse.ArgumentParser(description='Benchmark csv file search/masking.')
-  parser.add_argument('lines', type=int, help='The number of csv lines to create for the test file. Each line is 1kb in size.')
+  parser.add_argument('lines', type=int, help='The number of csv lines to create for the test file. Each line is 1kb in size. With any of the shape options, the size of each test file in kbs instead.')
   parser.add_argument('-i', '--iterations', metavar='N', type=int, default=10, help='The number of times the test should be run to obtain the average. Defaults to 10.')
-  
+  parser.add_argument('--generate-processes', metavar='N', type=int, default=1, help='The number of processes used to create the test file. Defaults to 1.')
+  parser.add_argument('--columns', metavar='LIST', type=list_of(int), help='Comma separated list of column counts. Defaults to 10.')
+  parser.add_argument('--width', metavar='LIST', type=list_of(int), help='Comma separated list of mean field widths in characters. Defaults to 10.')
+  parser.add_argument('--distribution', metavar='LIST', type=list_of(str, generator.csv_distributions),
+                      help=f'Comma separated list of field width distributions ({", ".join(generator.csv_distributions)}). Defaults to fixed.')
+  parser.add_argument('--header', metavar='LIST', type=list_of(lambda item: item == 'on', ['on', 'off']),
+                      help='Comma separated list of whether there is a header row (on, off). Defaults to on.')
+  parser.add_argument('--quoting', metavar='LIST', type=list_of(str, generator.csv_quoting),
+                      help=f'Comma separated list of quoting styles ({", ".join(generator.csv_quoting)}). Defaults to none.')
+  parser.add_argument('--delimiter', metavar='LIST', type=list_of(str, list(generator.csv_delimiters)),
+                      help=f'Comma separated list of delimiters ({", ".join(generator.csv_delimiters)}). Defaults to comma.')
+  parser.add_argument('--seed', type=int, default=0, help='Seed for the field widths. Defaults to 0.')
+  utils.add_benchmark_arguments(parser)
+
   args = parser.parse_args()
   lines = args.lines
   iterations = args.iterations
-  test_folder = 'test-files'
-  file_name = f'test-{lines}.csv'
-  file_path = f'{test_folder}/{file_name}'
-  os.makedirs(test_folder, exist_ok=True)
-  if not os.path.exists(file_path):
-    logging.info(f'Creating {file_name}...')
-    with open(file_path, 'w') as f:
-      test = 'this is a test'
-      char_num = 1000 - len(test) - len(os.linesep)
-      chars_per_col = 10
-      num_cols = int(char_num / chars_per_col)
-      remaining_padding = 'x' * (char_num % chars_per_col)
-      line = ','.join(['x' * (chars_per_col - 1) for i in range(num_cols)] + [f'{remaining_padding}this is a test'])
-      for i in range(lines):
-        f.write(line)
-        f.write(os.linesep)
-    logging.info(f'Created {file_name}.')
+  shapes = any(getattr(args, option) for option in shape_options)
+  if not shapes:
+    file_path = generator.test_file('csv', lines, args.generate_processes)
   with requests.Session() as session:
+    cache = utils.context_cache(session, args)
     try:
-      setup(session)
+      setup(session, cache)
       context = json.dumps({
           "fileSearchContextName": file_search_context_name,
           "fileMaskContextName": file_mask_context_name
       })
-      utils.benchmark_search_mask(session, file_path, context, 
-                                  lines, 'text/csv', iterations)
+      if shapes:
+        benchmark_shapes(session, context, args)
+      else:
+        utils.benchmark_search_mask(session, file_path, context,
+                                    lines, 'text/csv', iterations, records=lines,
+                                    **utils.benchmark_options(args))
     finally:
-      teardown(session)
+      teardown(session, cache)
@@ -0,0 +1,309 @@
+import csv
+import hashlib
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+import uuid
+
+from xml.sax.saxutils import escape, quoteattr
+
+import corpus
+
+cache_folder = 'test-files/cache'
+# The size of the blocks of records written at once.
+block_size = 1024 * 1024
+
+
+# A test file made of a header, 'count' copies of the same record and a footer. Since every
+# record has the same length, the offset of any record is known up front, so the file is
+# written in large blocks of repeated records and can be split into byte ranges that are
+# written in parallel.
+class Layout():
+
+  def __init__(self, header, record, count, footer=b'', records=None):
+    self.header = header
+    self.record = record
+    self.count = count
+    self.footer = footer
+    # The number of records in the file, when the header holds some of them.
+    self.records = count if records is None else records
+
+  def size(self):
+    return len(self.header) + len(self.record) * self.count + len(self.footer)
+
+  def offset(self, index):
+    return len(self.header) + len(self.record) * index
+
+
+def encode(text):
+  return text.encode('utf-8')
+
+
+# Each layout function takes the size of the file (in lines or kbs, as the format's main.py
+# always has) and returns its Layout.
+def text_layout(lines, test_line='this is a test', line_size=1000):
+  line = '#' * (line_size - len(test_line) - len(os.linesep)) + test_line + os.linesep
+  return Layout(b'', encode(line), lines)
+
+
+def csv_layout(lines, test='this is a test', line_size=1000, chars_per_col=10):
+  char_num = line_size - len(test) - len(os.linesep)
+  num_cols = int(char_num / chars_per_col)
+  remaining_padding = 'x' * (char_num % chars_per_col)
+  line = ','.join(['x' * (chars_per_col - 1) for i in range(num_cols)] + [f'{remaining_padding}{test}'])
+  return Layout(b'', encode(line + os.linesep), lines)
+
+
+csv_distributions = ['fixed', 'uniform', 'lognormal']
+csv_quoting = ['none', 'all', 'embedded']
+csv_delimiters = {'comma': ',', 'tab': '\t', 'pipe': '|', 'semicolon': ';'}
+
+
+def csv_width(rng, width, distribution):
+  if distribution == 'uniform':
+    return rng.randint(1, 2 * width - 1)
+  if distribution == 'lognormal':
+    return max(int(rng.lognormvariate(math.log(width), 0.75)), 1)
+  return width
+
+
+# A csv file of about file_size kbs with 'columns' columns whose widths follow a fixed,
+# uniform or lognormal distribution around 'width' characters, where the last column of each
+# row holds the test value. Fields are quoted only when needed ('none'), always ('all'), or
+# hold an embedded delimiter, quote and newline that must be quoted ('embedded'). A block
+# of 'block' seeded random rows is the repeated record, so the file is written as fast as
+# the fixed layouts, and the leading rows of the block are the footer that brings the file
+# closest to file_size. Logs a warning if a single row is too wide to get within size_tolerance.
+def csv_shape_layout(file_size, columns=10, width=10, distribution='fixed', header=True, quoting='none',
+                     delimiter=',', test='this is a test', seed=0, block=100, size_tolerance=0.05):
+  rng = random.Random(seed)
+  output = io.StringIO()
+  writer = csv.writer(output, delimiter=delimiter, lineterminator=os.linesep,
+                      quoting=csv.QUOTE_ALL if quoting == 'all' else csv.QUOTE_MINIMAL)
+  if header:
+    writer.writerow([f'column{i}' for i in range(columns)])
+  header = encode(output.getvalue())
+  rows = []
+  for _ in range(block):
+    row = []
+    for i in range(columns):
+      value = 'x' * csv_width(rng, width, distribution)
+      if quoting == 'embedded':
+        middle = len(value) // 2
+        value = f'{value[:middle]}{delimiter}"{os.linesep}{value[middle:]}'
+      row.append(value)
+    row[-1] = f'{row[-1]} {test}'
+    output.seek(0)
+    output.truncate()
+    writer.writerow(row)
+    rows.append(encode(output.getvalue()))
+  record = b''.join(rows)
+  target = file_size * 1000
+  count = max(int((target - len(header)) / len(record)), 0)
+  remaining = target - len(header) - len(record) * count
+  footer_rows = 0
+  footer_size = 0
+  while footer_rows < block and abs(remaining - footer_size - len(rows[footer_rows])) < abs(remaining - footer_size):
+    footer_size += len(rows[footer_rows])
+    footer_rows += 1
+  if not count and not footer_rows:
+    footer_rows = 1
+  layout = Layout(header, record, count, b''.join(rows[:footer_rows]), records=count * block + footer_rows)
+  if abs(layout.size() - target) > size_tolerance * target:
+    logging.warning(f'The csv file of {columns} columns of width {width} is {layout.size()} bytes instead of '
+                    f'{target}, as its rows are about {len(record) // block} bytes each.')
+  return layout
+
+
+# Pads the test value with x's to value_length characters, so the value stays a hit.
+def pad(test, value_length):
+  return test + 'x' * max((value_length or 0) - len(test), 0)
+
+
+# An XML element tree 'depth' levels deep where each element has 'fanout' children and the
+# leaves hold the test value, as a text node or as an attribute. Elements cycle through the
+# prefixes of 'namespaces' namespaces declared on the root element.
+def xml_element(depth, fanout, test, attributes=False, namespaces=0):
+  prefix = f'ns{depth % namespaces}:' if namespaces else ''
+  if not depth:
+    if attributes:
+      return f'<{prefix}leaf value={quoteattr(test)}/>'
+    return f'<{prefix}leaf>{escape(test)}</{prefix}leaf>'
+  children = ''.join(xml_element(depth - 1, fanout, test, attributes, namespaces) for _ in range(fanout))
+  return f'<{prefix}node>{children}</{prefix}node>'
+
+
+# Without a depth the root holds <div>test</div> lines, otherwise it holds one xml_element
+# tree per line. Raises ValueError if a single tree doesn't fit in file_size.
+def xml_layout(file_size, test='This is a test', depth=None, fanout=2, attributes=False, namespaces=0,
+               value_length=None):
+  declarations = ''.join(f' xmlns:ns{i}="urn:darkshield:benchmark:{i}"' for i in range(namespaces))
+  header = f'<?xml version="1.0" encoding="UTF-8"?>{os.linesep}<div{declarations}>{os.linesep}'
+  footer = f'</div>{os.linesep}'
+  if depth is None:
+    test_line = f'    <div>{test}</div>{os.linesep}'
+  else:
+    test_line = xml_element(depth, fanout, pad(test, value_length), attributes, namespaces) + os.linesep
+  num_tags = int((file_size * 1000 - len(header) - len(footer)) / len(test_line))
+  if depth is not None and num_tags < 1:
+    raise ValueError(f'An xml tree of depth {depth} and fanout {fanout} is {len(test_line)} bytes, '
+                     f'which doesn\'t fit in {file_size} kbs.')
+  return Layout(encode(header), encode(test_line), max(num_tags, 0), encode(footer))
+
+
+# A compact JSON object of 'width' string fields holding the test value, with 'fanout' more
+# fields holding the same object nested 'depth' levels deep.
+def json_record(width, depth, test, fanout=1):
+  record = {f'field{i}': test for i in range(width)}
+  for i in range(fanout if depth else 0):
+    record['nested' if fanout == 1 else f'nested{i}'] = json_record(width, depth - 1, test, fanout)
+  return record
+
+
+# Without a width the array holds the pretty-printed {"data": test} objects, otherwise it
+# holds one compact json_record per line, the same records as the jsonl layout. Raises
+# ValueError if a single record doesn't fit in file_size.
+def json_layout(file_size, test='This is a test', indent='    ', width=None, depth=0, fanout=1,
+                value_length=None):
+  open_array = f'[{os.linesep}'
+  close_array = f'{os.linesep}]{os.linesep}'
+  if width:
+    test_object = json.dumps(json_record(width, depth, pad(test, value_length), fanout))
+    if len(open_array) + len(test_object) + len(close_array) > file_size * 1000:
+      raise ValueError(f'A json record of width {width}, depth {depth} and fanout {fanout} is {len(test_object)} '
+                       f'bytes, which doesn\'t fit in {file_size} kbs.')
+  else:
+    test_object = f'{indent}{{{os.linesep}{indent}{indent}"data": {json.dumps(test)}{os.linesep}{indent}}}'
+  record = f',{os.linesep}{test_object}'
+  num_objects = int((file_size * 1000 - len(open_array) - len(test_object) - len(close_array)) / len(record))
+  num_objects = max(num_objects, 0)
+  return Layout(encode(open_array + test_object), encode(record), num_objects, encode(close_array),
+                num_objects + 1)
+
+
+def jsonl_layout(file_size, test='This is a test', width=1, depth=0):
+  record = json.dumps(json_record(width, depth, test)) + os.linesep
+  return Layout(b'', encode(record), max(int(file_size * 1000 / len(record)), 1))
+
+
+layouts = {
+  'txt': text_layout,
+  'csv': csv_layout,
+  'xml': xml_layout,
+  'json': json_layout,
+  'jsonl': jsonl_layout
+}
+
+
+# Writes the records [start, end) of a layout into a file that already has its full size.
+def write_range(file_path, layout, start, end):
+  per_block = max(block_size // max(len(layout.record), 1), 1)
+  block = layout.record * per_block
+  with open(file_path, 'r+b') as f:
+    f.seek(layout.offset(start))
+    remaining = end - start
+    while remaining >= per_block:
+      f.write(block)
+      remaining -= per_block
+    f.write(layout.record * remaining)
+
+
+def _write_range(arguments):
+  write_range(*arguments)
+
+
+# Writes a layout to file_path. With more than one process the records are split into
+# contiguous byte ranges, one per process, which are written into the preallocated file.
+def write_layout(file_path, layout, processes=1):
+  with open(file_path, 'wb') as f:
+    f.write(layout.header)
+    f.truncate(layout.size())
+    f.seek(layout.offset(layout.count))
+    f.write(layout.footer)
+  processes = max(min(processes, layout.count), 1)
+  bounds = [layout.count * i // processes for i in range(processes + 1)]
+  ranges = [(file_path, layout, bounds[i], bounds[i + 1]) for i in range(processes)]
+  if processes == 1:
+    _write_range(ranges[0])
+  else:
+    with multiprocessing.Pool(processes) as pool:
+      pool.map(_write_range, ranges)
+
+
+def cache_key(format, size, seed=None, **params):
+  key = json.dumps({'format': format, 'size': size, 'seed': seed, 'params': params}, sort_keys=True)
+  return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+# Returns the path of a test file in the content-addressed cache, keyed by its format, size,
+# seed and generator params, creating it with write(path) first if it isn't cached yet.
+# Files are written under a temporary name and renamed when complete, so an interrupted
+# run never leaves a partial file in the cache.
+def cached(format, size, write, seed=None, folder=cache_folder, **params):
+  key = cache_key(format, size, seed, **params)
+  file_path = f'{folder}/{key[:16]}-{size}.{format}'
+  if os.path.exists(file_path):
+    logging.info(f'Reusing cached {file_path}.')
+    return file_path
+  os.makedirs(folder, exist_ok=True)
+  temp_path = f'{file_path}.{uuid.uuid4().hex}.tmp'
+  logging.info(f'Creating {file_path}...')
+  try:
+    write(temp_path)
+    os.replace(temp_path, file_path)
+  finally:
+    if os.path.exists(temp_path):
+      os.remove(temp_path)
+  logging.info(f'Created {file_path}.')
+  return file_path
+
+
+# Returns the path of a cached test file of one of the layouts, e.g. test_file('txt', lines).
+def test_file(format, size, processes=1, folder=cache_folder, **params):
+  layout = layouts[format](size, **params)
+  return cached(format, size, lambda path: write_layout(path, layout, processes), folder=folder, **params)
+
+
+parquet_compressions = ['snappy', 'zstd', 'gzip', 'none']
+
+
+# Writes a Parquet file of 'records' rows of 'fields' string columns one row group at a time,
+# so only a single row group is ever held in memory whatever the number of records. Each
+# value is 'tokens' words and PII drawn from a corpus.Corpus with the seed, so that the
+# codec and dictionary settings see realistic, repetitive but varied text. A 'hit_density'
+# fraction of the values (all of them by default, as with the fixed layouts) start with the
+# test value found by the TestMatcher of parquet/setup.py, so that is the expected fraction
+# of values masked. Requires pyarrow.
+def write_parquet(file_path, records, fields, row_group_size=65536, compression='snappy',
+                  use_dictionary=True, data_page_size=1024 * 1024, seed=0, tokens=4, hit_density=1.0,
+                  test='this is a test'):
+  import pyarrow as pa
+  import pyarrow.parquet as pq
+  schema = pa.schema([(f'Test{i}', pa.string()) for i in range(fields)])
+  texts = corpus.Corpus(seed)
+  rng = random.Random(seed)
+
+  def value():
+    text = texts.text(tokens)
+    return f'{test} {text}' if rng.random() < hit_density else text
+
+  with pq.ParquetWriter(file_path, schema, compression=compression, use_dictionary=use_dictionary,
+                        data_page_size=data_page_size) as writer:
+    written = 0
+    while written < records:
+      rows = min(row_group_size, records - written)
+      columns = [pa.array([value() for _ in range(rows)], pa.string()) for _ in range(fields)]
+      writer.write_table(pa.Table.from_arrays(columns, schema=schema), row_group_size=row_group_size)
+      written += rows
+
+
+# Returns the path of a cached Parquet test file, see write_parquet for the options.
+def parquet_file(records, fields, folder=cache_folder, seed=0, tokens=4, hit_density=1.0, **options):
+  def write(path):
+    write_parquet(path, records, fields, seed=seed, tokens=tokens, hit_density=hit_density, **options)
+  return cached('parquet', records, write, seed=seed, folder=folder, fields=fields, tokens=tokens,
+                hit_density=hit_density, **options)
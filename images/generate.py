@@ -0,0 +1,66 @@
+import mimetypes
+import random
+
+from PIL import Image, ImageDraw, ImageFont
+
+import corpus
+import generator
+
+# The Pillow format name and save options of each extension.
+formats = {
+    'png': ('PNG', {}),
+    'jpeg': ('JPEG', {'quality': 90}),
+    'tiff': ('TIFF', {'compression': 'tiff_lzw'})
+}
+# The size of the rendered text in points, converted to pixels using the image's DPI.
+font_points = 12
+
+
+def media_type(file_path):
+    return mimetypes.guess_type(file_path)[0] or ''
+
+
+def parse_resolution(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def load_font(size):
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        # Pillow before 10.1 only has a fixed size bitmap font.
+        return ImageFont.load_default()
+
+
+# Renders a form-like page of 'Name: FIRST LAST  SSN: ddd-dd-dddd' entries in black on white,
+# laid out in as many columns as fit. The font size follows the DPI, as a scanned document
+# would, and density is the fraction of the page's entry slots that hold text. Every name
+# rendered is in the set written by corpus.Corpus.write_names, and every SSN matches the
+# SsnMatcher.
+def render(file_path, width, height, dpi=300, density=0.5, format='png', seed=0):
+    rng = random.Random(seed)
+    people = corpus.Corpus(seed)
+    font_size = max(int(font_points * dpi / 72), 8)
+    font = load_font(font_size)
+    line_height = int(font_size * 1.5)
+    lines = max(int(height / line_height), 1)
+    margin = font_size
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    column_width = int(draw.textlength('Name: CHRISTOPHER RODRIGUEZ  SSN: 000-00-0000', font=font)) + margin
+    columns = max(int((width - margin) / column_width), 1)
+    for line in range(lines):
+        for column in range(columns):
+            if rng.random() < density:
+                draw.text((margin + column * column_width, line * line_height),
+                          f'Name: {people.name()}  SSN: {people.ssn()}', fill='black', font=font)
+    pillow_format, options = formats[format]
+    image.save(file_path, pillow_format, dpi=(dpi, dpi), **options)
+
+
+# Returns the path of a cached rendered image.
+def image_file(width, height, dpi=300, density=0.5, format='png', seed=0):
+    return generator.cached(format, f'{width}x{height}',
+                            lambda path: render(path, width, height, dpi, density, format, seed),
+                            seed=seed, dpi=dpi, density=density)
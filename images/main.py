@@ -1,9 +1,13 @@
 import argparse
+import concurrent.futures
+import itertools
 import json
 import logging
 import os
 import requests
 import sys
+import threading
+import time
 
 # Append parent directory to PYTHON_PATH so we can import utils.py
 current_dir = os.path.dirname(os.path.realpath(__file__))
@@ -12,27 +16,155 @@ sys.path.append(parent_dir)
 
 from setup import setup, teardown, file_mask_context_name, file_search_context_name
 
+import corpus
+import generate
+import stats
 import utils
 
+
+def list_of(parse):
+    return lambda value: [parse(item) for item in value.split(',')]
+
+
+# Times each image in turn, and fits the latency against the number of megapixels.
+def sweep_latency(session, context, images, args):
+    rows = []
+    for file_path, (width, height), dpi, density, format in images:
+        label = f'sweep/{format}-{width}x{height}-dpi{dpi}-density{density:g}'
+        results = utils.benchmark_search_mask(session, file_path, context, label, generate.media_type(file_path),
+                                              args.iterations, **utils.benchmark_options(args))
+        megapixels = width * height / 1000000
+        rows.append({
+            'format': format,
+            'width': width,
+            'height': height,
+            'megapixels': megapixels,
+            'dpi': dpi,
+            'density': density,
+            'bytes': os.path.getsize(file_path),
+            'mean': results['latency']['mean'],
+            'p50': results['latency']['p50'],
+            'p99': results['latency']['p99'],
+            'secondsPerMegapixel': results['latency']['mean'] / megapixels
+        })
+        logging.info(f'{label}: {megapixels:.2f} megapixels, mean {rows[-1]["mean"]:.4f} seconds.')
+    fits = []
+    for format in args.formats:
+        format_rows = [row for row in rows if row['format'] == format]
+        fit = stats.linear_fit([row['megapixels'] for row in format_rows], [row['mean'] for row in format_rows])
+        if fit:
+            fits.append({'format': format, 'fixedLatency': fit[0], 'secondsPerMegapixel': fit[1]})
+            logging.info(f'{format}: {fit[1]:.4f} seconds per megapixel, {fit[0]:.4f} seconds fixed.')
+    utils.write_results('results/sweep', rows, 'latency')
+    if fits:
+        utils.write_results('results/sweep', fits, 'fit')
+
+
+# Sends 'requests' images, cycling through the sweep's images, from each number of
+# concurrent threads. Each thread has its own session and results folder.
+def sweep_throughput(context, images, args):
+    options = utils.benchmark_options(args)
+    compression = options['compression']
+    recorder = options['recorder']
+    rows = []
+    for concurrency in args.concurrency:
+        local = threading.local()
+        sessions = []
+
+        def send(index):
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+                sessions.append(local.session)
+            file_path = images[index % len(images)][0]
+            folder_name = f'results/throughput/{concurrency}/{threading.current_thread().name}'
+            media_type = generate.media_type(file_path)
+
+            def mask():
+                return utils.mask_file(local.session, file_path, context, media_type, folder_name,
+                                       compression=compression)
+
+            if recorder is not None:
+                mask = recorder.wrap(mask, file_path, media_type, context, compression)
+            start = time.perf_counter()
+            mask()
+            return time.perf_counter() - start, images[index % len(images)][1]
+
+        histogram = stats.Histogram()
+        megapixels = 0
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+            for elapsed, (width, height) in executor.map(send, range(args.requests)):
+                histogram.record(elapsed)
+                megapixels += width * height / 1000000
+        elapsed = time.perf_counter() - start
+        for session in sessions:
+            session.close()
+        rows.append({
+            'concurrency': concurrency,
+            'images': args.requests,
+            'elapsed': elapsed,
+            'imagesPerSecond': args.requests / elapsed,
+            'megapixelsPerSecond': megapixels / elapsed,
+            'p50': histogram.percentile(50),
+            'p99': histogram.percentile(99)
+        })
+        logging.info(f'{concurrency} concurrent: {rows[-1]["imagesPerSecond"]:.2f} images/s, '
+                     f'{rows[-1]["megapixelsPerSecond"]:.2f} megapixels/s, p99 {rows[-1]["p99"]:.4f} seconds.')
+    utils.write_results('results/throughput', rows, 'throughput')
+
+
 if __name__ == '__main__':
     logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
     parser = argparse.ArgumentParser(description='Benchmark image file search/masking.')
     parser.add_argument('-i', '--iterations', metavar='N', type=int, default=10,
                         help='The number of times the test should be run to obtain the average. Defaults to 10.')
     parser.add_argument('-f', '--file', type=str, default="example.jpeg", help='The image file to get a benchmark on.')
+    parser.add_argument('--sweep', action='store_true',
+                        help='Benchmark generated images of each resolution, DPI, density and format instead of --file.')
+    parser.add_argument('--resolutions', metavar='LIST', type=list_of(generate.parse_resolution),
+                        default=[(640, 480), (1280, 960), (2480, 3508)],
+                        help='Comma separated list of WIDTHxHEIGHT image resolutions. Defaults to 640x480,1280x960,2480x3508.')
+    parser.add_argument('--dpi', metavar='LIST', type=list_of(int), default=[150, 300],
+                        help='Comma separated list of image DPIs, which set the font size. Defaults to 150,300.')
+    parser.add_argument('--density', metavar='LIST', type=list_of(float), default=[0.5],
+                        help='Comma separated list of the fractions of text slots filled. Defaults to 0.5.')
+    parser.add_argument('--formats', metavar='LIST', type=list_of(str), default=list(generate.formats),
+                        help=f'Comma separated list of image formats ({", ".join(generate.formats)}). Defaults to all.')
+    parser.add_argument('-c', '--concurrency', metavar='LIST', type=list_of(int), default=[1, 2, 4, 8],
+                        help='Comma separated list of the number of concurrent requests for the throughput sweep. Defaults to 1,2,4,8.')
+    parser.add_argument('-n', '--requests', metavar='N', type=int, default=32,
+                        help='The number of images sent at each concurrency. Defaults to 32.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the rendered names and SSNs. Defaults to 0.')
+    utils.add_benchmark_arguments(parser)
     args = parser.parse_args()
     iterations = args.iterations
     file_name = args.file
-    if not os.path.exists(file_name):
+    names_path = 'names.set'
+    images = []
+    if args.sweep:
+        names_path = f'{generate.generator.cache_folder}/names.set'
+        os.makedirs(generate.generator.cache_folder, exist_ok=True)
+        corpus.Corpus.write_names(names_path)
+        for (width, height), dpi, density, format in itertools.product(args.resolutions, args.dpi, args.density,
+                                                                      args.formats):
+            file_path = generate.image_file(width, height, dpi, density, format, args.seed)
+            images.append((file_path, (width, height), dpi, density, format))
+    elif not os.path.exists(file_name):
         raise FileNotFoundError(f"File does not exist at path {file_name}. Aborting.")
     with requests.Session() as session:
+        cache = utils.context_cache(session, args)
         try:
-            setup(session)
+            setup(session, cache, names_path)
             context = json.dumps({
                 "fileSearchContextName": file_search_context_name,
                 "fileMaskContextName": file_mask_context_name
             })
-            utils.benchmark_search_mask(session, file_name, context,
-                                        os.path.getsize(file_name), '', iterations)
+            if args.sweep:
+                sweep_latency(session, context, images, args)
+                sweep_throughput(context, images, args)
+            else:
+                utils.benchmark_search_mask(session, file_name, context,
+                                            os.path.getsize(file_name), generate.media_type(file_name), iterations,
+                                            **utils.benchmark_options(args))
         finally:
-            teardown(session)
+            teardown(session, cache)
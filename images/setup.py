@@ -7,7 +7,7 @@ file_search_context_name = "FileSearchContext"
 file_mask_context_name = "FileMaskContext"
 
 
-def setup(session):
+def contexts(names_path='names.set'):
     search_context = {
         "name": search_context_name,
         "matchers": [
@@ -19,7 +19,7 @@ def setup(session):
             {
                 "name": "NameMatcher",
                 "type": "set",
-                "url": pathlib.Path('names.set').absolute().as_uri()
+                "url": pathlib.Path(names_path).absolute().as_uri()
             }
         ]
     }
@@ -63,14 +63,17 @@ def setup(session):
         ]
     }
 
-    utils.create_context(session, "searchContext", search_context)
-    utils.create_context(session, "maskContext", mask_context)
-    utils.create_context(session, "files/fileSearchContext", file_search_context)
-    utils.create_context(session, "files/fileMaskContext", file_mask_context)
+    return [
+        ("searchContext", search_context),
+        ("maskContext", mask_context),
+        ("files/fileSearchContext", file_search_context),
+        ("files/fileMaskContext", file_mask_context)
+    ]
 
 
-def teardown(session):
-    utils.destroy_context(session, "searchContext", search_context_name)
-    utils.destroy_context(session, "maskContext", mask_context_name)
-    utils.destroy_context(session, "files/fileSearchContext", file_search_context_name)
-    utils.destroy_context(session, "files/fileMaskContext", file_mask_context_name)
+def setup(session, cache=None, names_path='names.set'):
+    utils.create_contexts(session, contexts(names_path), cache)
+
+
+def teardown(session, cache=None):
+    utils.destroy_contexts(session, contexts(), cache)
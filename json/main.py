@@ -12,6 +12,7 @@ sys.path.append(parent_dir)
 
 from setup import setup, teardown, file_mask_context_name, file_search_context_name
 
+import generator
 import utils
 
 if __name__ == '__main__':
@@ -19,39 +20,24 @@ if __name__ == '__main__':
   parser = argparse.ArgumentParser(description='Benchmark json file search/masking.')
   parser.add_argument('file_size', type=int, help='The size of the json file in kbs.')
   parser.add_argument('-i', '--iterations', metavar='N', type=int, default=10, help='The number of times the test should be run to obtain the average. Defaults to 10.')
+  parser.add_argument('--generate-processes', metavar='N', type=int, default=1, help='The number of processes used to create the test file. Defaults to 1.')
+  utils.add_benchmark_arguments(parser)
   
   args = parser.parse_args()
   file_size = args.file_size
   iterations = args.iterations
-  test_folder = 'test-files'
-  file_name = f'test-{file_size}.json'
-  file_path = f'{test_folder}/{file_name}'
-  os.makedirs(test_folder, exist_ok=True)
-  if not os.path.exists(file_path):
-    logging.info(f'Creating {file_name}...')
-    with open(file_path, 'w') as f:
-      open_array = f'[{os.linesep}'
-      close_array = f']{os.linesep}'
-      indent = '    '
-      initial_size = len(open_array) + len(close_array)
-      start_object = ''
-      test_object = f'{indent}{{{os.linesep}{indent}{indent}"data": "This is a test"{os.linesep}{indent}}}'
-      num_objects = int((file_size - initial_size) * 1000 /  len(test_object))
-      f.write(open_array)
-      f.write(test_object)
-      for i in range(num_objects):
-        f.write(f',{os.linesep}{test_object}')
-      f.write(os.linesep)
-      f.write(close_array)
-    logging.info(f'Created {file_name}.')
+  file_path = generator.test_file('json', file_size, args.generate_processes)
   with requests.Session() as session:
+    cache = utils.context_cache(session, args)
     try:
-      setup(session)
+      setup(session, cache)
       context = json.dumps({
           "fileSearchContextName": file_search_context_name,
           "fileMaskContextName": file_mask_context_name
       })
       utils.benchmark_search_mask(session, file_path, context, 
-                                  file_size, 'application/json', iterations)
+                                  file_size, 'application/json', iterations,
+                                  records=generator.layouts['json'](file_size).records,
+                                  **utils.benchmark_options(args))
     finally:
-      teardown(session)
+      teardown(session, cache)
@@ -0,0 +1,86 @@
+import argparse
+import json
+import logging
+import os
+import requests
+import sys
+
+# Append parent directory to PYTHON_PATH so we can import utils.py
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from setup import setup, teardown, file_mask_context_name, file_search_context_name
+
+import generator
+import stats
+import utils
+
+# Each mode sends the same records at the same size, as JSON Lines that can be processed a
+# record at a time, or as a single JSON array document.
+modes = {
+  'jsonl': 'application/x-ndjson',
+  'json': 'application/json'
+}
+
+
+# Fits latency = fixed + per_record * records. Returns (fixed, per_record), or
+# (None, latency / records) when there is a single size.
+def fit_latency(records, latencies):
+  fit = stats.linear_fit(records, latencies)
+  return fit or (None, latencies[0] / records[0])
+
+
+if __name__ == '__main__':
+  logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+  parser = argparse.ArgumentParser(description='Benchmark JSON Lines file search/masking against single JSON documents.')
+  parser.add_argument('file_sizes', metavar='file_size', type=lambda value: [int(size) for size in value.split(',')],
+                      help='Comma separated list of the sizes of the test files in kbs.')
+  parser.add_argument('-w', '--width', metavar='N', type=int, default=1, help='The number of string fields in each object. Defaults to 1.')
+  parser.add_argument('-d', '--depth', metavar='N', type=int, default=0, help='The number of nested objects in each object. Defaults to 0.')
+  parser.add_argument('-m', '--modes', metavar='LIST', type=lambda value: value.split(','), default=list(modes),
+                      help='Comma separated list of modes to run (jsonl, json). Defaults to both.')
+  parser.add_argument('-i', '--iterations', metavar='N', type=int, default=10, help='The number of times the test should be run to obtain the average. Defaults to 10.')
+  utils.add_benchmark_arguments(parser)
+
+  args = parser.parse_args()
+  shape = {'width': args.width, 'depth': args.depth}
+  rows = []
+  with requests.Session() as session:
+    cache = utils.context_cache(session, args)
+    try:
+      setup(session, cache)
+      context = json.dumps({
+          "fileSearchContextName": file_search_context_name,
+          "fileMaskContextName": file_mask_context_name
+      })
+      for file_size in args.file_sizes:
+        for mode in args.modes:
+          file_path = generator.test_file(mode, file_size, **shape)
+          records = generator.layouts[mode](file_size, **shape).records
+          results = utils.benchmark_search_mask(session, file_path, context, f'{file_size}/{mode}',
+                                                modes[mode], args.iterations, records=records,
+                                                **utils.benchmark_options(args))
+          rows.append({
+            'mode': mode,
+            'size': file_size,
+            'bytes': os.path.getsize(file_path),
+            'records': records,
+            'megabytesPerSecond': results['throughput']['megabytesPerSecond'],
+            'recordsPerSecond': results['throughput']['recordsPerSecond'],
+            'mean': results['latency']['mean'],
+            'p50': results['latency']['p50'],
+            'p99': results['latency']['p99'],
+            'latencyPerRecord': results['latency']['mean'] / records
+          })
+    finally:
+      teardown(session, cache)
+  fits = []
+  for mode in args.modes:
+    mode_rows = [row for row in rows if row['mode'] == mode]
+    fixed, per_record = fit_latency([row['records'] for row in mode_rows], [row['mean'] for row in mode_rows])
+    fits.append({'mode': mode, 'fixedLatency': fixed, 'latencyPerRecord': per_record})
+    logging.info(f'{mode}: {per_record * 1000000:.3f} microseconds per record'
+                 + (f', {fixed:.4f} seconds fixed.' if fixed is not None else '.'))
+  utils.write_results('results', rows, 'comparison')
+  utils.write_results('results', fits, 'latency_per_record')
@@ -0,0 +1,72 @@
+import utils
+
+search_context_name = "SearchContext"
+mask_context_name = "MaskContext"
+file_search_context_name = "FileSearchContext"
+file_mask_context_name = "FileMaskContext"
+
+def contexts():
+  search_context = {
+    "name": search_context_name,
+    "matchers": [
+      {
+        "name": "TestMatcher",
+        "type": "pattern",
+        "pattern": "test"
+      }
+    ]
+  }
+
+  mask_context = {
+    "name": mask_context_name,
+    "rules": [
+      {
+        "name": "TestRule",
+        "type": "cosort",
+        "expression": "enc_fp_aes256_alphanum($\{NAME\})"
+      }
+    ],
+    "ruleMatchers": [
+      {
+        "name": "TestNameRuleMatcher",
+        "type": "name",
+        "rule": "TestRule",
+        "pattern": "TestMatcher"
+      }
+    ]
+  }
+
+  file_search_context = {
+    "name": file_search_context_name,
+    "matchers": [
+      {
+        "name": search_context_name,
+        "type": "searchContext"
+      }
+    ]
+  }
+
+  file_mask_context = {
+    "name": file_mask_context_name,
+    "rules": [
+      {
+        "name": mask_context_name,
+        "type": "maskContext"
+      }
+    ]
+  }
+
+  return [
+    ("searchContext", search_context),
+    ("maskContext", mask_context),
+    ("files/fileSearchContext", file_search_context),
+    ("files/fileMaskContext", file_mask_context)
+  ]
+
+
+def setup(session, cache=None):
+  utils.create_contexts(session, contexts(), cache)
+
+
+def teardown(session, cache=None):
+  utils.destroy_contexts(session, contexts(), cache)
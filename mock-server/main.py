@@ -0,0 +1,179 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+from aiohttp import web
+
+# Append parent directory to PYTHON_PATH so we can import server_config.py
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from server_config import port
+
+context_types = ['searchContext', 'maskContext', 'files/fileSearchContext', 'files/fileMaskContext']
+
+
+# The simulated cost of a single mask request: a fixed overhead plus a cost per KB
+# of uploaded file, scaled by a uniform random jitter. At most 'concurrency' requests
+# are serviced at once (0 means unlimited), the rest wait for a free slot.
+class ServiceModel():
+
+  def __init__(self, overhead, per_kb, concurrency, jitter, seed=None):
+    self.overhead = overhead
+    self.per_kb = per_kb
+    self.jitter = jitter
+    self.random = random.Random(seed)
+    self.semaphore = asyncio.Semaphore(concurrency) if concurrency > 0 else None
+
+  def service_time(self, size):
+    service_time = self.overhead + self.per_kb * size / 1024
+    if self.jitter:
+      service_time *= 1 + self.random.uniform(-self.jitter, self.jitter)
+    return max(service_time, 0)
+
+  async def serve(self, size):
+    service_time = self.service_time(size)
+    if self.semaphore is None:
+      await asyncio.sleep(service_time)
+    else:
+      async with self.semaphore:
+        await asyncio.sleep(service_time)
+    return service_time
+
+
+def error(status, message):
+  return web.json_response({'error': message}, status=status)
+
+
+def create_handler(context_type):
+  async def handler(request):
+    data = await request.json()
+    name = data.get('name')
+    if not name:
+      return error(400, f'{context_type} definition has no name.')
+    request.app['contexts'][context_type][name] = data
+    logging.info('Created %s "%s".', context_type, name)
+    return web.json_response({})
+  return handler
+
+
+def destroy_handler(context_type):
+  async def handler(request):
+    data = await request.json()
+    name = data.get('name')
+    if request.app['contexts'][context_type].pop(name, None) is None:
+      return error(404, f'{context_type} "{name}" does not exist.')
+    logging.info('Destroyed %s "%s".', context_type, name)
+    return web.json_response({})
+  return handler
+
+
+async def mask_handler(request):
+  app = request.app
+  chunk_size = app['chunk_size']
+  start = time.perf_counter()
+  context = None
+  file_name = 'file'
+  content_type = 'application/octet-stream'
+  size = 0
+  # The uploaded file is spooled so that memory stays bounded for large uploads.
+  with tempfile.SpooledTemporaryFile(max_size=app['spool_limit']) as spool:
+    reader = await request.multipart()
+    part = await reader.next()
+    while part is not None:
+      if part.name == 'context':
+        context = json.loads(await part.text())
+      elif part.name == 'file':
+        file_name = part.filename or file_name
+        content_type = part.headers.get('Content-Type', content_type)
+        chunk = await part.read_chunk(chunk_size)
+        while chunk:
+          spool.write(chunk)
+          size += len(chunk)
+          chunk = await part.read_chunk(chunk_size)
+      part = await reader.next()
+
+    if context is None:
+      return error(400, 'Missing context part.')
+    search_name = context.get('fileSearchContextName')
+    mask_name = context.get('fileMaskContextName')
+    if search_name not in app['contexts']['files/fileSearchContext']:
+      return error(400, f'files/fileSearchContext "{search_name}" does not exist.')
+    if mask_name not in app['contexts']['files/fileMaskContext']:
+      return error(400, f'files/fileMaskContext "{mask_name}" does not exist.')
+
+    service_time = await app['model'].serve(size)
+
+    boundary = uuid.uuid4().hex
+    response = web.StreamResponse(headers={
+      'Content-Type': f'multipart/form-data; boundary={boundary}'
+    })
+    # Compresses the response if the client accepts a supported Content-Encoding.
+    response.enable_compression()
+    await response.prepare(request)
+    await response.write((f'--{boundary}\r\n'
+                          f'Content-Disposition: form-data; name="file"; filename="{file_name}"\r\n'
+                          f'Content-Type: {content_type}\r\n\r\n').encode())
+    spool.seek(0)
+    chunk = spool.read(chunk_size)
+    while chunk:
+      await response.write(chunk)
+      chunk = spool.read(chunk_size)
+    results = json.dumps({
+      'file': file_name,
+      'bytes': size,
+      'serviceTime': service_time,
+      'elapsedTime': time.perf_counter() - start
+    })
+    await response.write((f'\r\n--{boundary}\r\n'
+                          'Content-Disposition: form-data; name="results"; filename="results.json"\r\n'
+                          'Content-Type: application/json\r\n\r\n'
+                          f'{results}\r\n--{boundary}--\r\n').encode())
+    await response.write_eof()
+    return response
+
+
+async def create_app(args):
+  # Uploads are streamed by the mask handler, so the request body size is not limited.
+  app = web.Application(client_max_size=sys.maxsize)
+  app['contexts'] = {context_type: {} for context_type in context_types}
+  app['model'] = ServiceModel(args.overhead_ms / 1000, args.per_kb_ms / 1000,
+                              args.concurrency, args.jitter, args.seed)
+  app['chunk_size'] = args.chunk_size
+  app['spool_limit'] = args.spool_limit
+  for context_type in context_types:
+    app.router.add_post(f'/api/darkshield/{context_type}.create', create_handler(context_type))
+    app.router.add_post(f'/api/darkshield/{context_type}.destroy', destroy_handler(context_type))
+  app.router.add_post('/api/darkshield/files/fileSearchContext.mask', mask_handler)
+  return app
+
+
+if __name__ == '__main__':
+  logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+  parser = argparse.ArgumentParser(description='Local stand-in for the DarkShield Files API.')
+  parser.add_argument('--host', type=str, default='localhost', help='The interface to listen on. Defaults to localhost.')
+  parser.add_argument('--port', type=int, default=int(port), help='The port to listen on. Defaults to the port in server_config.py.')
+  parser.add_argument('--overhead-ms', metavar='MS', type=float, default=5.0,
+                      help='Fixed service time of each mask request in milliseconds. Defaults to 5.')
+  parser.add_argument('--per-kb-ms', metavar='MS', type=float, default=0.01,
+                      help='Additional service time per KB of uploaded file in milliseconds. Defaults to 0.01.')
+  parser.add_argument('--concurrency', metavar='N', type=int, default=8,
+                      help='The max number of mask requests serviced at once, 0 for unlimited. Defaults to 8.')
+  parser.add_argument('--jitter', metavar='F', type=float, default=0.0,
+                      help='Uniform random jitter applied to the service time as a fraction, e.g. 0.1 for +/-10%%. Defaults to 0.')
+  parser.add_argument('--seed', type=int, help='Seed for the jitter random number generator.')
+  parser.add_argument('-c', '--chunk-size', metavar='N', type=int, default=65536,
+                      help='The chunk size used to read uploads and stream responses. Defaults to 65536.')
+  parser.add_argument('--spool-limit', metavar='N', type=int, default=8 * 1024 * 1024,
+                      help='Uploads larger than this many bytes are spooled to disk. Defaults to 8 MB.')
+
+  args = parser.parse_args()
+  web.run_app(create_app(args), host=args.host, port=args.port)
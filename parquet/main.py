@@ -1,10 +1,10 @@
 import argparse
+import itertools
 import json
 import logging
 import os
 import requests
 import sys
-import pandas as pd
 
 # Append parent directory to PYTHON_PATH so we can import utils.py
 current_dir = os.path.dirname(os.path.realpath(__file__))
@@ -13,42 +13,108 @@ sys.path.append(parent_dir)
 
 from setup import setup, teardown, file_mask_context_name, file_search_context_name
 
+import generator
+import schemas
 import utils
 
-# Simple setup, only fields of string type with no nesting or arrays in this benchmark.
+
+def int_list(value):
+  return [int(item) for item in value.split(',')]
+
+
+def choice_list(choices):
+  def parse(value):
+    items = value.split(',')
+    for item in items:
+      if item not in choices:
+        raise argparse.ArgumentTypeError(f'invalid choice: {item} (choose from {", ".join(choices)})')
+    return items
+  return parse
+
+
+# By default every field is a flat string. With --schema the fields have the types of each
+# shape in schemas.py instead, nested --depth levels deep. Every combination of the shapes
+# and layout options given is benchmarked, so that several values of each run as a matrix.
 if __name__ == '__main__':
   logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
   parser = argparse.ArgumentParser(description='Benchmark Parquet file search/masking.')
   parser.add_argument('records', type=int, help='The number of records to create for the test file.')
   parser.add_argument('fields', type=int, help='The number of fields to create for the test file.')
   parser.add_argument('-i', '--iterations', metavar='N', type=int, default=10, help='The number of times the test should be run to obtain the average. Defaults to 10.')
+  parser.add_argument('--row-group-size', metavar='LIST', type=int_list, default=[65536],
+                      help='Comma separated list of the max number of rows per row group. Defaults to 65536.')
+  parser.add_argument('--codec', metavar='LIST', type=choice_list(generator.parquet_compressions), default=['snappy'],
+                      help=f'Comma separated list of compression codecs ({", ".join(generator.parquet_compressions)}). Defaults to snappy.')
+  parser.add_argument('--dictionary', metavar='LIST', type=choice_list(['on', 'off']), default=['on'],
+                      help='Comma separated list of dictionary encoding settings (on, off). Defaults to on.')
+  parser.add_argument('--page-size', metavar='LIST', type=int_list, default=[1024 * 1024],
+                      help='Comma separated list of data page sizes in bytes. Defaults to 1048576.')
+  parser.add_argument('--schema', metavar='LIST', type=choice_list(list(schemas.shapes)),
+                      help=f'Comma separated list of schema shapes ({", ".join(schemas.shapes)}).')
+  parser.add_argument('--depth', metavar='N', type=int, default=1, help='The nesting depth of struct, list and map shapes. Defaults to 1.')
+  parser.add_argument('--null-ratio', metavar='F', type=float, default=0.0,
+                      help='The fraction of null values at each level of the schema shapes. Defaults to 0.')
+  parser.add_argument('--seed', type=int, default=0, help='Seed for the generated values. Defaults to 0.')
+  parser.add_argument('--hit-density', metavar='F', type=float, default=1.0,
+                      help=('The fraction of string values that hold the test value found by the search context, '
+                            'without --schema. Defaults to 1, every value.'))
+  utils.add_benchmark_arguments(parser)
 
   args = parser.parse_args()
   records = args.records
   fieldNumber = args.fields
   iterations = args.iterations
-  test_folder = 'test-files'
-  file_name = f'test-{records}.parquet'
-  file_path = f'{test_folder}/{file_name}'
-  os.makedirs(test_folder, exist_ok=True)
-  lst = [[0] * fieldNumber for i in range(records)]
-  cols = []
-  for f in range(fieldNumber):
-    cols.append('Test{}'.format(f))
-  for r in range(records):
-    for f in range(fieldNumber):
-      lst[r][f] = "this is a test"
-  df = pd.DataFrame(lst, columns = cols)
-  df.to_parquet(file_path)
-  logging.info(f'Created {file_name}.')
+  layouts = list(itertools.product(args.schema or [None], args.row_group_size, args.codec, args.dictionary,
+                                   args.page_size))
+  rows = []
   with requests.Session() as session:
+    cache = utils.context_cache(session, args)
     try:
-      setup(session)
+      setup(session, cache)
       context = json.dumps({
           "fileSearchContextName": file_search_context_name,
           "fileMaskContextName": file_mask_context_name
       })
-      utils.benchmark_search_mask(session, file_path, context, 
-                                  records, 'application/x-parquet', iterations)
+      for shape, row_group_size, codec, dictionary, page_size in layouts:
+        layout = {
+          'row_group_size': row_group_size,
+          'compression': codec,
+          'use_dictionary': dictionary == 'on',
+          'data_page_size': page_size
+        }
+        if shape:
+          file_path = schemas.parquet_file(records, fieldNumber, shape, args.depth, args.null_ratio, args.seed, **layout)
+        else:
+          file_path = generator.parquet_file(records, fieldNumber, seed=args.seed, hit_density=args.hit_density,
+                                             **layout)
+        folders = [str(records)]
+        if shape:
+          folders.append(f'{shape}-depth{args.depth}-nulls{args.null_ratio:g}')
+        if len(layouts) > len(args.schema or [None]):
+          folders.append(f'rg{row_group_size}-{codec}-dict-{dictionary}-page{page_size}')
+        label = '/'.join(folders)
+        results = utils.benchmark_search_mask(session, file_path, context,
+                                              label, 'application/x-parquet', iterations, records=records,
+                                              **utils.benchmark_options(args))
+        row = {
+          'schema': shape or 'strings',
+          'depth': args.depth if shape else 0,
+          'nullRatio': args.null_ratio if shape else 0,
+          'hitDensity': None if shape else args.hit_density,
+          'rowGroupSize': row_group_size,
+          'codec': codec,
+          'dictionary': dictionary,
+          'pageSize': page_size,
+          'fileBytes': os.path.getsize(file_path),
+          'megabytesPerSecond': results['throughput']['megabytesPerSecond'],
+          'recordsPerSecond': results['throughput']['recordsPerSecond'],
+          'p50': results['latency']['p50'],
+          'p99': results['latency']['p99']
+        }
+        logging.info(f'{row["schema"]}, row groups of {row_group_size}, {codec}, dictionary {dictionary}, pages of {page_size}: '
+                     f'{row["fileBytes"]} bytes, {row["recordsPerSecond"]:.1f} records/s, p99 {row["p99"]:.4f} seconds.')
+        rows.append(row)
     finally:
-      teardown(session)
+      teardown(session, cache)
+  if len(layouts) > 1:
+    utils.write_results(f'results/{records}', rows, 'matrix')
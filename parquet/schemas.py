@@ -0,0 +1,130 @@
+import datetime
+import decimal
+import random
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import generator
+
+# The string value found by the TestMatcher in setup.py.
+value = 'this is a test'
+# The max number of items in each generated list or map.
+max_items = 3
+
+
+# Each shape returns the type of column i of a schema nested 'depth' levels deep.
+def strings(i, depth):
+  return pa.string()
+
+
+def numerics(i, depth):
+  return [pa.int32(), pa.int64(), pa.float64(), pa.decimal128(12, 2), pa.bool_()][i % 5]
+
+
+def timestamps(i, depth):
+  return [pa.timestamp('ms'), pa.timestamp('us', tz='UTC'), pa.date32()][i % 3]
+
+
+def struct(i, depth):
+  fields = [pa.field('name', pa.string()), pa.field('id', pa.int64())]
+  if depth > 1:
+    fields.append(pa.field('child', struct(i, depth - 1)))
+  return pa.struct(fields)
+
+
+def list_(i, depth):
+  return pa.list_(list_(i, depth - 1) if depth > 1 else pa.string())
+
+
+def map_(i, depth):
+  return pa.map_(pa.string(), map_(i, depth - 1) if depth > 1 else pa.string())
+
+
+def mixed(i, depth):
+  return [strings, numerics, timestamps, struct, list_, map_][i % 6](i // 6, depth)
+
+
+shapes = {
+  'strings': strings,
+  'numerics': numerics,
+  'timestamps': timestamps,
+  'struct': struct,
+  'list': list_,
+  'map': map_,
+  'mixed': mixed
+}
+
+
+def schema(shape, fields, depth):
+  return pa.schema([pa.field(f'Test{i}', shapes[shape](i, depth)) for i in range(fields)])
+
+
+def nulls(rng, count, null_ratio):
+  return [rng.random() < null_ratio for _ in range(count)]
+
+
+# Returns an array of 'count' random values of a (possibly nested) type, where each value
+# is null with probability null_ratio. String leaves hold the test value so that every
+# string in the file is a hit, whatever its depth.
+def values(data_type, count, rng, null_ratio):
+  mask = nulls(rng, count, null_ratio)
+  if pa.types.is_struct(data_type):
+    children = [values(field.type, count, rng, null_ratio) for field in data_type]
+    return pa.StructArray.from_arrays(children, fields=list(data_type), mask=pa.array(mask))
+  if pa.types.is_list(data_type) or pa.types.is_map(data_type):
+    offsets = [0]
+    for _ in range(count):
+      offsets.append(offsets[-1] + rng.randint(0, max_items))
+    offsets = pa.array([None if null else offset for null, offset in zip(mask + [False], offsets)], pa.int32())
+    total = offsets[-1].as_py()
+    if pa.types.is_map(data_type):
+      keys = pa.array([f'key{i % max_items}' for i in range(total)], data_type.key_type)
+      return pa.MapArray.from_arrays(offsets, keys, values(data_type.item_type, total, rng, null_ratio))
+    return pa.ListArray.from_arrays(offsets, values(data_type.value_type, total, rng, null_ratio))
+  if pa.types.is_string(data_type):
+    items = [value] * count
+  elif pa.types.is_boolean(data_type):
+    items = [rng.random() < 0.5 for _ in range(count)]
+  elif pa.types.is_integer(data_type):
+    items = [rng.randint(0, 1 << 30) for _ in range(count)]
+  elif pa.types.is_decimal(data_type):
+    items = [decimal.Decimal(rng.randint(0, 10 ** 10)).scaleb(-2) for _ in range(count)]
+  elif pa.types.is_floating(data_type):
+    items = [rng.random() * 1000 for _ in range(count)]
+  elif pa.types.is_date(data_type):
+    items = [datetime.date(2020, 1, 1) + datetime.timedelta(days=rng.randint(0, 3650)) for _ in range(count)]
+  elif pa.types.is_timestamp(data_type):
+    start = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc if data_type.tz else None)
+    items = [start + datetime.timedelta(seconds=rng.randint(0, 10 ** 8)) for _ in range(count)]
+  else:
+    raise ValueError(f'Unsupported type {data_type}.')
+  return pa.array([None if null else item for null, item in zip(mask, items)], data_type)
+
+
+# Writes a Parquet file of 'records' rows with the given shape one row group at a time. A
+# single row group of random values is generated and written repeatedly, so that memory
+# and generation time are bounded by the row group size.
+def write_parquet(file_path, records, fields, shape, depth=1, null_ratio=0.0, seed=0,
+                  row_group_size=65536, compression='snappy', use_dictionary=True, data_page_size=1024 * 1024):
+  rng = random.Random(seed)
+  table_schema = schema(shape, fields, depth)
+  rows = min(row_group_size, records)
+  columns = [values(field.type, rows, rng, null_ratio) for field in table_schema]
+  table = pa.Table.from_arrays(columns, schema=table_schema)
+  with pq.ParquetWriter(file_path, table_schema, compression=compression, use_dictionary=use_dictionary,
+                        data_page_size=data_page_size) as writer:
+    written = 0
+    while written < records:
+      rows = min(row_group_size, records - written)
+      writer.write_table(table.slice(0, rows), row_group_size=row_group_size)
+      written += rows
+
+
+# Returns the path of a cached Parquet test file with the given shape. The layout options
+# are those of generator.write_parquet.
+def parquet_file(records, fields, shape, depth=1, null_ratio=0.0, seed=0, **layout):
+  options = dict(layout, shape=shape, depth=depth, null_ratio=null_ratio)
+  return generator.cached('parquet', records,
+                          lambda path: write_parquet(path, records, fields, seed=seed, **options),
+                          seed=seed, fields=fields, **options)
@@ -6,7 +6,7 @@ mask_context_name = "MaskContext"
 file_search_context_name = "FileSearchContext"
 file_mask_context_name = "FileMaskContext"
 
-def setup(session):
+def contexts():
   search_context = {
     "name": search_context_name,
     "matchers": [
@@ -56,14 +56,17 @@ def setup(session):
     ]
   }
 
-  utils.create_context(session, "searchContext", search_context)
-  utils.create_context(session, "maskContext", mask_context)
-  utils.create_context(session, "files/fileSearchContext", file_search_context)
-  utils.create_context(session, "files/fileMaskContext", file_mask_context)
+  return [
+    ("searchContext", search_context),
+    ("maskContext", mask_context),
+    ("files/fileSearchContext", file_search_context),
+    ("files/fileMaskContext", file_mask_context)
+  ]
 
 
-def teardown(session):
-  utils.destroy_context(session, "searchContext", search_context_name)
-  utils.destroy_context(session, "maskContext", mask_context_name)
-  utils.destroy_context(session, "files/fileSearchContext", file_search_context_name)
-  utils.destroy_context(session, "files/fileMaskContext", file_mask_context_name)
+def setup(session, cache=None):
+  utils.create_contexts(session, contexts(), cache)
+
+
+def teardown(session, cache=None):
+  utils.destroy_contexts(session, contexts(), cache)
@@ -0,0 +1,73 @@
+import argparse
+import json
+import logging
+import os
+import requests
+import sys
+
+# Append parent directory to PYTHON_PATH so we can import utils.py
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from setup import setup, teardown, file_mask_context_name, file_search_context_name
+
+import corpus
+import utils
+
+
+def parse_weights(value):
+  weights = {}
+  for item in value.split(','):
+    kind, weight = item.split('=')
+    weights[kind] = float(weight)
+  return weights
+
+
+if __name__ == '__main__':
+  logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+  parser = argparse.ArgumentParser(description='Benchmark search/masking of synthetic content with a controlled PII density.')
+  parser.add_argument('format', choices=sorted(corpus.writers), help='The format of the test file.')
+  parser.add_argument('file_size', type=int, help='The size of the test file in kbs (uncompressed text for parquet).')
+  parser.add_argument('-d', '--hit-density', metavar='F', type=float, default=0.1,
+                      help='The fraction of tokens that are PII, from 0 to 1. Defaults to 0.1.')
+  parser.add_argument('-m', '--pii-mix', metavar='WEIGHTS', type=parse_weights, default={},
+                      help='Relative weights of each kind of PII, e.g. name=2,ssn=1,email=1. Defaults to equal weights.')
+  parser.add_argument('--distribution', choices=['zipf', 'uniform'], default='zipf',
+                      help='The distribution of the non-PII words. Defaults to zipf.')
+  parser.add_argument('--fields', metavar='N', type=int, help='The number of fields per record (1 for txt, 5 otherwise by default).')
+  parser.add_argument('--tokens', metavar='N', type=int, help='The number of tokens per field (20 for txt, 4 otherwise by default).')
+  parser.add_argument('--seed', type=int, default=0, help='Seed for the generated content. Defaults to 0.')
+  parser.add_argument('-i', '--iterations', metavar='N', type=int, default=10, help='The number of times the test should be run to obtain the average. Defaults to 10.')
+  utils.add_benchmark_arguments(parser)
+
+  args = parser.parse_args()
+  test_folder = 'test-files'
+  os.makedirs(test_folder, exist_ok=True)
+  names_path = f'{test_folder}/corpus-names.set'
+  corpus.Corpus.write_names(names_path)
+  mix = '-'.join(f'{kind}{weight:g}' for kind, weight in sorted(args.pii_mix.items()))
+  file_name = f'test-{args.file_size}-d{args.hit_density:g}-{args.distribution}-{mix or "equal"}-s{args.seed}.{args.format}'
+  file_path = f'{test_folder}/{file_name}'
+  layout = {key: value for key, value in (('fields', args.fields), ('tokens', args.tokens)) if value}
+  logging.info(f'Creating {file_name}...')
+  generator = corpus.Corpus(args.seed, args.hit_density, args.distribution, args.pii_mix)
+  records = corpus.writers[args.format](generator, file_path, args.file_size * 1000, **layout)
+  logging.info(f'Created {file_name} with {records} records and {generator.hits} hits.')
+  with requests.Session() as session:
+    cache = utils.context_cache(session, args)
+    try:
+      setup(session, names_path, cache)
+      context = json.dumps({
+          "fileSearchContextName": file_search_context_name,
+          "fileMaskContextName": file_mask_context_name
+      })
+      results = utils.benchmark_search_mask(session, file_path, context,
+                                            f'corpus/{file_name}', corpus.media_types[args.format],
+                                            args.iterations, records=records,
+                                            **utils.benchmark_options(args))
+      results['hitDensity'] = args.hit_density
+      results['hits'] = generator.hits
+      utils.write_results(f'results/corpus/{file_name}', results)
+    finally:
+      teardown(session, cache)
@@ -0,0 +1,84 @@
+import pathlib
+import utils
+
+search_context_name = "CorpusSearchContext"
+mask_context_name = "CorpusMaskContext"
+file_search_context_name = "CorpusFileSearchContext"
+file_mask_context_name = "CorpusFileMaskContext"
+
+
+def contexts(names_path):
+  search_context = {
+    "name": search_context_name,
+    "matchers": [
+      {
+        "name": "SsnMatcher",
+        "type": "pattern",
+        "pattern": r"\b(\d{3}[-]?\d{2}[-]?\d{4})\b"
+      },
+      {
+        "name": "EmailMatcher",
+        "type": "pattern",
+        "pattern": r"\b[\w.+-]+@[\w-]+(\.[\w-]+)+\b"
+      },
+      {
+        "name": "NameMatcher",
+        "type": "set",
+        "url": pathlib.Path(names_path).absolute().as_uri()
+      }
+    ]
+  }
+
+  mask_context = {
+    "name": mask_context_name,
+    "rules": [
+      {
+        "name": "TestRule",
+        "type": "cosort",
+        "expression": "enc_fp_aes256_alphanum(${NAME})"
+      }
+    ],
+    "ruleMatchers": [
+      {
+        "name": "TestNameRuleMatcher",
+        "type": "name",
+        "rule": "TestRule",
+        "pattern": ".*"
+      }
+    ]
+  }
+
+  file_search_context = {
+    "name": file_search_context_name,
+    "matchers": [
+      {
+        "name": search_context_name,
+        "type": "searchContext"
+      }
+    ]
+  }
+
+  file_mask_context = {
+    "name": file_mask_context_name,
+    "rules": [
+      {
+        "name": mask_context_name,
+        "type": "maskContext"
+      }
+    ]
+  }
+
+  return [
+    ("searchContext", search_context),
+    ("maskContext", mask_context),
+    ("files/fileSearchContext", file_search_context),
+    ("files/fileMaskContext", file_mask_context)
+  ]
+
+
+def setup(session, names_path, cache=None):
+  utils.create_contexts(session, contexts(names_path), cache)
+
+
+def teardown(session, cache=None):
+  utils.destroy_contexts(session, contexts(''), cache)
@@ -0,0 +1,149 @@
+import argparse
+import logging
+import math
+import os
+import random
+import requests
+import sys
+
+# Append parent directory to PYTHON_PATH so we can import utils.py, and the scenario
+# directory so we can run the trace with its workload runner.
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+sys.path.append(f'{parent_dir}/scenario')
+
+import generator
+import traffic
+import utils
+import workload as workloads
+from stats import Histogram
+
+# Extensions recorded in traces that the workload formats name differently.
+format_aliases = {'jpg': 'jpeg', 'tif': 'tiff'}
+# The number of fields of the parquet test files, and the number of records of the file
+# generated to measure their bytes per record.
+parquet_fields = 5
+parquet_calibration_records = 10000
+
+
+# Rounds a size to two significant figures, so that requests of about the same size share a
+# test file and a class.
+def bucket(size):
+  if size <= 0:
+    return 0
+  return round(size, 1 - int(math.floor(math.log10(size))))
+
+
+# Returns the workload class that creates a test file of about 'size' bytes in 'format'.
+def trace_class(format, size, calibration):
+  name = f'{format}-{size}'
+  # txt and csv sizes are in lines of 1kb, json, jsonl and xml sizes in kbs.
+  if format in ('txt', 'csv', 'json', 'jsonl', 'xml'):
+    return {'name': name, 'format': format, 'size': max(size // 1000, 1)}
+  # Parquet compresses and encodes its values, so the number of records comes from the bytes
+  # per record of a generated file with the same fields.
+  if format == 'parquet':
+    if format not in calibration:
+      file_path = generator.parquet_file(parquet_calibration_records, parquet_fields)
+      calibration[format] = os.path.getsize(file_path) / parquet_calibration_records
+    records = max(int(size / calibration[format]), 1)
+    return {'name': name, 'format': format, 'records': records, 'fields': parquet_fields}
+  # Images compress differently per format, so the resolution comes from the bytes per pixel
+  # of a 1000x1000 render of the same format, at a 4:3 aspect ratio.
+  if format not in calibration:
+    generate = workloads.load_module('images', 'generate')
+    calibration[format] = os.path.getsize(generate.image_file(1000, 1000, format=format)) / 1000000
+  pixels = max(size / calibration[format], 1)
+  width = max(int(math.sqrt(pixels * 4 / 3)), 1)
+  return {'name': name, 'format': format, 'resolution': f'{width}x{max(int(width * 3 / 4), 1)}'}
+
+
+# Turns a trace into a workload of one class per (format, size bucket), and the arrivals of
+# the trace: each entry at its offset from the first divided by 'speed', repeated
+# int(multiply) times plus once more with the probability of the fraction of multiply.
+def replay_workload(entries, name, speed, multiply, concurrency, seed):
+  rng = random.Random(seed)
+  calibration = {}
+  classes = {}
+  arrivals = []
+  start = entries[0]['timestamp']
+  skipped = set()
+  for entry in entries:
+    format = format_aliases.get(entry['format'], entry['format'])
+    if format not in workloads.formats:
+      skipped.add(format)
+      continue
+    key = (format, bucket(entry['bytes']))
+    if key not in classes:
+      classes[key] = dict(trace_class(*key, calibration), weight=0, recorded=Histogram())
+    classes[key]['weight'] += 1
+    classes[key]['recorded'].record(entry['latency'])
+    copies = int(multiply) + (1 if rng.random() < multiply - int(multiply) else 0)
+    arrivals.extend([((entry['timestamp'] - start) / speed, classes[key])] * copies)
+  if skipped:
+    logging.warning(f'Skipping the requests of unknown formats: {", ".join(sorted(skipped))}.')
+  workload = dict(workloads.defaults, name=name, classes=list(classes.values()), concurrency=concurrency,
+                  duration=arrivals[-1][0] if arrivals else 0, seed=seed)
+  return workload, arrivals
+
+
+if __name__ == '__main__':
+  logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+  parser = argparse.ArgumentParser(description='Replay a recorded request trace against the server.')
+  parser.add_argument('trace', nargs='?', default=traffic.trace_file,
+                      help=f'The JSON Lines trace written with --record. Defaults to {traffic.trace_file}.')
+  parser.add_argument('-s', '--speed', metavar='N', type=float, default=1.0,
+                      help='Compress the time between requests by this factor. Defaults to 1.')
+  parser.add_argument('-m', '--multiply', metavar='N', type=float, default=1.0,
+                      help='Send each request this many times. A fraction sends one more copy with that probability. Defaults to 1.')
+  parser.add_argument('-c', '--concurrency', metavar='N', type=int, default=32,
+                      help='The number of requests in flight at once. Defaults to 32.')
+  parser.add_argument('--seed', type=int, default=0, help='Seed for the fractional copies of --multiply. Defaults to 0.')
+  parser.add_argument('--compression', choices=utils.compressions,
+                      help='Compress the request body and request a compressed response.')
+  parser.add_argument('--keep-contexts', action='store_true',
+                      help=(f'Keep the server contexts after the run and reuse them in later runs while their '
+                            f'definitions are unchanged. The contexts created are tracked in {utils.contexts_file}.'))
+
+  args = parser.parse_args()
+  entries = traffic.read_trace(args.trace)
+  if not entries:
+    raise ValueError(f'The trace {args.trace} has no requests. Aborting.')
+  trace_name = os.path.splitext(os.path.basename(args.trace))[0]
+  folder_name = f'results/replay/{trace_name}-x{args.speed:g}-m{args.multiply:g}'
+  workload, arrivals = replay_workload(entries, os.path.basename(folder_name), args.speed, args.multiply,
+                                       args.concurrency, args.seed)
+  contexts = workloads.prepare(workload, prefix='Replay')
+  with requests.Session() as session:
+    cache = utils.context_cache(session, args)
+    try:
+      utils.create_contexts(session, contexts, cache)
+      logging.info(f'Replaying {len(entries)} requests as {len(arrivals)} over {workload["duration"]:.1f} seconds '
+                   f'with {workload["concurrency"]} workers.')
+      runner = workloads.Runner(workload, f'{folder_name}/files', args.compression)
+      stats = runner.run(arrivals)
+    finally:
+      utils.destroy_contexts(session, contexts, cache)
+  # Report per format, since size buckets are too fine grained to compare against the trace.
+  by_format = {}
+  for request_class in workload['classes']:
+    format_stats, recorded = by_format.setdefault(request_class['format'], (workloads.ClassStats(), Histogram()))
+    format_stats.merge(stats[request_class['name']])
+    recorded.merge(request_class['recorded'])
+  total = (workloads.ClassStats(), Histogram())
+  rows = []
+  for format, (format_stats, recorded) in list(by_format.items()) + [('all', total)]:
+    if format != 'all':
+      total[0].merge(format_stats)
+      total[1].merge(recorded)
+    row = workloads.summarize(format, None, format_stats, runner.elapsed)
+    row['format'] = format
+    del row['weight']
+    row['recordedP99'] = recorded.percentile(99)
+    row['p99Ratio'] = row['p99'] / row['recordedP99'] if format_stats.requests and row['recordedP99'] else None
+    rows.append(row)
+    if row['requests']:
+      logging.info(f'{format}: {row["requests"]} requests, {row["requestsPerSecond"]:.2f} requests/s, '
+                   f'p99 {row["p99"]:.4f} seconds, {row["recordedP99"]:.4f} recorded.')
+  utils.write_results(folder_name, rows, 'summary')
@@ -4,7 +4,9 @@ import asyncio
 import argparse
 import json
 import logging
+import os
 import sys
+import time
 
 from boto3.s3.transfer import TransferConfig
 
@@ -15,6 +17,7 @@ parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
 from server_config import hostname, port, is_https
+import tracing
 
 host = f'http{"s" if is_https else ""}://{hostname}:{port}/api/darkshield'
 
@@ -30,8 +33,9 @@ class PartReader():
 
 
 # Used to stream the s3 object directly to the API without storing it all in memory or on file.
-async def s3_object_sender(obj, chunk_size):
-  obj = await obj.get()
+async def s3_object_sender(obj, chunk_size, recorder=None, track=None):
+  with tracing.span(recorder, track, 'S3 GET'):
+    obj = await obj.get()
   async with obj['Body'] as stream:
     chunk = await stream.read(chunk_size)
     while chunk:
@@ -39,14 +43,19 @@ async def s3_object_sender(obj, chunk_size):
       chunk = await stream.read(chunk_size)
 
 
-# An asyncio worker that processes s3 objects out of a queue.
-async def s3_obj_worker(name, queue, session, bucket, context, chunk_size, no_results):
+# An asyncio worker that processes (s3 object, enqueue time) items out of a queue. With a
+# recorder, the time waiting for an object and each step of processing it are recorded on
+# the worker's track.
+async def s3_obj_worker(name, queue, session, bucket, context, chunk_size, no_results, recorder=None):
   url = f'{host}/files/fileSearchContext.mask'
   while True:
-    obj = await queue.get()
+    with tracing.span(recorder, name, 'idle'):
+      obj, enqueued = await queue.get()
+    started = time.perf_counter()
     logging.info('%s: Starting task...', name)
     file_name = obj.key
-    await obj.load() # Load the metadata for this object.
+    with tracing.span(recorder, name, 'S3 HEAD'):
+      await obj.load() # Load the metadata for this object.
     content_type = obj.meta.data.get('ContentType', 'application/octet-stream')
     logging.info('%s: Processing "%s"...', name, file_name)
     logging.info('%s: Content type: %s', name, content_type)
@@ -60,11 +69,14 @@ async def s3_obj_worker(name, queue, session, bucket, context, chunk_size, no_re
       data.add_field('context', context,
                       filename='context',
                       content_type='application/json')
-      data.add_field('file', s3_object_sender(obj, chunk_size),
+      spans = tracing.RequestSpans(recorder, name, 'mask request')
+      body = s3_object_sender(obj, chunk_size, recorder, name)
+      data.add_field('file', spans.body(body) if recorder is not None else body,
                     filename=file_name,
                     content_type=content_type)
       logging.info('%s: Sending request to API...', name)
       async with session.post(url, data=data) as r:
+        spans.response_started()
         if r.status != 200:
           logging.error('%s: Failed to mask with error code %d: %s', 
                         name, r.status, await r.content.read())
@@ -79,7 +91,8 @@ async def s3_obj_worker(name, queue, session, bucket, context, chunk_size, no_re
               config = TransferConfig(
                 multipart_threshold=chunk_size
               )
-              await bucket.upload_fileobj(PartReader(part), target, Config=config)
+              with tracing.span(recorder, name, 'S3 upload', key=target):
+                await bucket.upload_fileobj(PartReader(part), target, Config=config)
             elif part.name == 'results' and not no_results:
               file_name = file_name.replace('.', '_')
               target = f'darkshield-results/{file_name}-results.json'
@@ -87,18 +100,24 @@ async def s3_obj_worker(name, queue, session, bucket, context, chunk_size, no_re
               config = TransferConfig(
                 multipart_threshold=chunk_size
               )
-              await bucket.upload_fileobj(PartReader(part), target, Config=config)
+              with tracing.span(recorder, name, 'S3 upload', key=target):
+                await bucket.upload_fileobj(PartReader(part), target, Config=config)
 
             part = await reader.next()
 
         logging.info('%s: Processed "%s".', name, file_name)
+      spans.end(status=r.status)
 
+    if recorder is not None:
+      recorder.add(name, 'object', started, time.perf_counter(), key=obj.key, queueWait=started - enqueued)
     queue.task_done()
     logging.info('%s: Task completed.', name)
 
 
 async def main(bucket_name, prefix, args):
   boto_session = aioboto3.session.Session(profile_name=args.profile)
+  recorder = tracing.SpanRecorder('s3-async') if args.trace else None
+  monitor = asyncio.create_task(tracing.monitor_event_loop(recorder)) if recorder is not None else None
   async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=0)) as session,\
     boto_session.resource('s3') as s3:
 
@@ -111,7 +130,7 @@ async def main(bucket_name, prefix, args):
       })
       queue = asyncio.Queue(args.workers)
       workers = [asyncio.create_task(s3_obj_worker(f'worker-{i}', queue, session,
-                 bucket, context, args.chunk_size, args.no_results)) for i in range(args.workers)]
+                 bucket, context, args.chunk_size, args.no_results, recorder)) for i in range(args.workers)]
       logging.info('Created %d workers.', args.workers)
 
       if prefix:
@@ -122,7 +141,7 @@ async def main(bucket_name, prefix, args):
         objects = bucket.objects.all()
 
       async for obj in objects:
-        await queue.put(obj)
+        await queue.put((obj, time.perf_counter()))
       
       # wait for either `queue.join()` to complete or a consumer to raise
       done, _ = await asyncio.wait([queue.join(), *workers],
@@ -136,6 +155,9 @@ async def main(bucket_name, prefix, args):
       for worker in workers:
         worker.cancel()
     finally:
+      if recorder is not None:
+        monitor.cancel()
+        recorder.write(args.trace)
       await teardown(session)
 
 
@@ -154,6 +176,9 @@ if __name__ == "__main__":
                         help='Disable the generation of results.json files.')
     parser.add_argument('-p', '--profile', metavar='name', type=str, 
                         help='The name of AWS profile to use for the connection (otherwise the default is used).')
+    parser.add_argument('--trace', metavar='FILE', type=str,
+                        help=('Record the queue wait, S3 GET, upload, server time, response and S3 uploads of every '
+                              'object on a track per worker, and write them to FILE in the Chrome trace event format.'))
     parser.add_argument('-w', '--workers', metavar='N', type=int, default=4,
                         help=('The max number of workers to use to process the files. '
                               'The default number is 4.'))
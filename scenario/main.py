@@ -0,0 +1,87 @@
+import argparse
+import logging
+import os
+import requests
+import sys
+
+# Append parent directory to PYTHON_PATH so we can import utils.py
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+import utils
+import workload as workloads
+
+
+# Runs each class on its own from a single worker, to give the latency of each class
+# without interference from the others.
+def run_baselines(workload, folder_name, duration, compression):
+  baselines = {}
+  for request_class in workload['classes']:
+    alone = dict(workload, classes=[request_class], concurrency=1, arrival=None, duration=duration)
+    logging.info(f'Running {request_class["name"]} alone for {duration} seconds...')
+    stats = workloads.Runner(alone, f'{folder_name}/baseline', compression).run()[request_class['name']]
+    baselines[request_class['name']] = stats.latency
+  return baselines
+
+
+if __name__ == '__main__':
+  logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+  parser = argparse.ArgumentParser(description='Benchmark search/masking under a mixed workload of formats and sizes.')
+  parser.add_argument('workload', help='The workload JSON file, see workload.py.')
+  parser.add_argument('-d', '--duration', metavar='SECONDS', type=float, help='Override the duration of the workload.')
+  parser.add_argument('-c', '--concurrency', metavar='N', type=int, help='Override the concurrency of the workload.')
+  parser.add_argument('-r', '--rate', metavar='N', type=float, help='Override the arrival rate of the workload.')
+  parser.add_argument('--baseline', metavar='SECONDS', type=float,
+                      help='First run each class on its own for this many seconds, and report how much the mix inflates its latency.')
+  parser.add_argument('--compression', choices=utils.compressions,
+                      help='Compress the request body and request a compressed response.')
+  parser.add_argument('--keep-contexts', action='store_true',
+                      help=(f'Keep the server contexts after the run and reuse them in later runs while their '
+                            f'definitions are unchanged. The contexts created are tracked in {utils.contexts_file}.'))
+  parser.add_argument('--record', metavar='FILE', nargs='?', const=utils.trace_file,
+                      help=f'Append the metadata of every request to a JSON Lines trace for replay/main.py. Defaults to {utils.trace_file}.')
+
+  args = parser.parse_args()
+  workload = workloads.load(args.workload)
+  if args.duration:
+    workload['duration'] = args.duration
+  if args.concurrency:
+    workload['concurrency'] = args.concurrency
+  if args.rate:
+    workload['arrival'] = dict(workload['arrival'] or {}, rate=args.rate)
+  folder_name = f'results/{workload["name"]}'
+  contexts = workloads.prepare(workload)
+  with requests.Session() as session:
+    cache = utils.context_cache(session, args)
+    try:
+      utils.create_contexts(session, contexts, cache)
+      baselines = {}
+      if args.baseline:
+        baselines = run_baselines(workload, f'{folder_name}/files', args.baseline, args.compression)
+      arrival = workload['arrival']
+      logging.info(f'Running {workload["name"]} for {workload["duration"]} seconds with {workload["concurrency"]} workers'
+                   + (f' at {arrival["rate"]} requests/s ({arrival.get("pattern", "fixed")}).' if arrival else '.'))
+      recorder = utils.TraceRecorder(args.record) if args.record else None
+      runner = workloads.Runner(workload, f'{folder_name}/files', args.compression, recorder)
+      stats = runner.run()
+    finally:
+      utils.destroy_contexts(session, contexts, cache)
+  rows = []
+  total = workloads.ClassStats()
+  for request_class in workload['classes']:
+    class_stats = stats[request_class['name']]
+    total.merge(class_stats)
+    row = workloads.summarize(request_class['name'], request_class, class_stats, runner.elapsed)
+    baseline = baselines.get(request_class['name'])
+    if baseline is not None and baseline.count and class_stats.requests:
+      row['baselineP99'] = baseline.percentile(99)
+      row['p99Inflation'] = row['p99'] / row['baselineP99']
+    rows.append(row)
+  rows.append(workloads.summarize('all', None, total, runner.elapsed))
+  for row in rows:
+    if row['requests']:
+      logging.info(f'{row["class"]}: {row["requests"]} requests, {row["requestsPerSecond"]:.2f} requests/s, '
+                   f'p50 {row["p50"]:.4f}, p99 {row["p99"]:.4f} seconds'
+                   + (f', {row["p99Inflation"]:.2f}x p99 alone.' if 'p99Inflation' in row else '.'))
+  utils.write_results(folder_name, rows, 'summary')
@@ -0,0 +1,286 @@
+import importlib.util
+import json
+import logging
+import os
+import queue
+import random
+import requests
+import sys
+import threading
+import time
+
+# Append parent directory to PYTHON_PATH so we can import generator.py
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+import corpus
+import generator
+import utils
+from stats import Histogram, percentiles
+
+# The benchmark folder whose setup.py contexts are used for each format, and its media type.
+formats = {
+  'txt': ('text', 'text/plain'),
+  'csv': ('csv', 'text/csv'),
+  'json': ('json', 'application/json'),
+  'jsonl': ('jsonl', 'application/x-ndjson'),
+  'xml': ('xml', 'application/xml'),
+  'parquet': ('parquet', 'application/x-parquet'),
+  'png': ('images', 'image/png'),
+  'jpeg': ('images', 'image/jpeg'),
+  'tiff': ('images', 'image/tiff')
+}
+
+# A workload file is a JSON object with the keys:
+#   name - the name of the results folder
+#   duration - how long to run for in seconds
+#   concurrency - the number of requests in flight at once (workers)
+#   arrival - optional {"rate": requests per second, "pattern": "fixed" or "poisson"}, which
+#             sends requests on a schedule instead of as fast as the workers allow
+#   seed - optional seed for the class choices and arrivals
+#   classes - the request classes, each with a name, a format (see formats), a weight, and
+#             the test file options of its format:
+#               txt, csv - size (lines of 1kb), json, jsonl, xml - size (kbs), and any
+#                 generator layout params in params
+#               parquet - records, fields, and optionally schema, depth, null_ratio
+#               png, jpeg, tiff - resolution (WIDTHxHEIGHT), dpi, density
+defaults = {
+  'duration': 30,
+  'concurrency': 4,
+  'arrival': None,
+  'seed': 0
+}
+
+
+def load(path):
+  with open(path) as f:
+    workload = dict(defaults, **json.load(f))
+  workload.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+  for request_class in workload['classes']:
+    if request_class['format'] not in formats:
+      raise ValueError(f'Unknown format {request_class["format"]} in class {request_class["name"]}.')
+    request_class.setdefault('weight', 1)
+  return workload
+
+
+def load_module(folder, name):
+  spec = importlib.util.spec_from_file_location(f'{folder}_{name}', f'{parent_dir}/{folder}/{name}.py')
+  module = importlib.util.module_from_spec(spec)
+  spec.loader.exec_module(module)
+  return module
+
+
+# Returns the path of the test file of a class, created with the generator of its format.
+def test_file(request_class, seed):
+  format = request_class['format']
+  if format == 'parquet':
+    if request_class.get('schema'):
+      schemas = load_module('parquet', 'schemas')
+      return schemas.parquet_file(request_class['records'], request_class['fields'], request_class['schema'],
+                                  request_class.get('depth', 1), request_class.get('null_ratio', 0.0), seed)
+    return generator.parquet_file(request_class['records'], request_class['fields'])
+  if formats[format][0] == 'images':
+    generate = load_module('images', 'generate')
+    width, height = generate.parse_resolution(request_class.get('resolution', '1280x960'))
+    return generate.image_file(width, height, request_class.get('dpi', 300), request_class.get('density', 0.5),
+                               format, seed)
+  return generator.test_file(format, request_class['size'], **request_class.get('params', {}))
+
+
+# Returns the contexts of a benchmark folder's setup.py, with every context name prefixed so
+# that the contexts of several folders can exist on the server at the same time.
+def folder_contexts(folder, prefix, names_path):
+  setup = load_module(folder, 'setup')
+  if folder == 'text':
+    definitions = setup.contexts(None)
+  elif folder == 'images':
+    definitions = setup.contexts(names_path)
+  else:
+    definitions = setup.contexts()
+  renamed = []
+  for context_type, definition in definitions:
+    definition = json.loads(json.dumps(definition))
+    definition['name'] = prefix + definition['name']
+    for item in definition.get('matchers', []) + definition.get('rules', []):
+      if item.get('type') in ('searchContext', 'maskContext'):
+        item['name'] = prefix + item['name']
+    renamed.append((context_type, definition))
+  return renamed
+
+
+# Prepares every class of a workload: creates its test file, and returns the contexts to
+# create along with each class's file path, media type, size and request context.
+def prepare(workload, test_folder=generator.cache_folder, prefix='Scenario'):
+  names_path = f'{test_folder}/names.set'
+  os.makedirs(test_folder, exist_ok=True)
+  corpus.Corpus.write_names(names_path)
+  contexts = []
+  file_contexts = {}
+  for request_class in workload['classes']:
+    folder, media_type = formats[request_class['format']]
+    if folder not in file_contexts:
+      definitions = folder_contexts(folder, prefix + folder.capitalize(), names_path)
+      contexts.extend(definitions)
+      file_contexts[folder] = {context_type: definition['name'] for context_type, definition in definitions}
+    file_path = test_file(request_class, workload['seed'])
+    request_class.update({
+      'file_path': file_path,
+      'media_type': media_type,
+      'bytes': os.path.getsize(file_path),
+      'context': json.dumps({
+        'fileSearchContextName': file_contexts[folder]['files/fileSearchContext'],
+        'fileMaskContextName': file_contexts[folder]['files/fileMaskContext']
+      })
+    })
+  return contexts
+
+
+# Chooses request classes by weight.
+class Chooser():
+
+  def __init__(self, classes, seed):
+    self.classes = classes
+    self.weights = [request_class['weight'] for request_class in classes]
+    self.random = random.Random(seed)
+
+  def choose(self):
+    return self.random.choices(self.classes, weights=self.weights)[0]
+
+
+# The requests, errors and latencies of one request class. Latency is measured from the
+# time a request was scheduled, so it includes any queue wait in open-loop runs.
+class ClassStats():
+
+  def __init__(self):
+    self.latency = Histogram()
+    self.queue_wait = Histogram()
+    self.requests = 0
+    self.errors = 0
+    self.bytes = 0
+
+  def merge(self, other):
+    self.latency.merge(other.latency)
+    self.queue_wait.merge(other.queue_wait)
+    self.requests += other.requests
+    self.errors += other.errors
+    self.bytes += other.bytes
+    return self
+
+
+def summarize(name, request_class, stats, elapsed):
+  row = {
+    'class': name,
+    'format': request_class['format'] if request_class else 'all',
+    'weight': request_class['weight'] if request_class else None,
+    'requests': stats.requests,
+    'errors': stats.errors,
+    'requestsPerSecond': stats.requests / elapsed,
+    'megabytesPerSecond': stats.bytes / elapsed / 1000000,
+    'mean': stats.latency.mean()
+  }
+  for p in percentiles:
+    row[f'p{p:g}'] = stats.latency.percentile(p)
+  row['queueWaitP99'] = stats.queue_wait.percentile(99)
+  return row
+
+
+# Runs a workload from 'concurrency' threads, each with its own session. Without an arrival
+# rate each thread sends its next request as soon as the last one completes. With one, or
+# with explicit arrivals passed to run(), a scheduler queues each request at its time and
+# the threads take them from the queue. Returns the stats of each class by name.
+class Runner():
+
+  def __init__(self, workload, folder_name, compression=None, recorder=None):
+    self.workload = workload
+    self.folder_name = folder_name
+    self.compression = compression
+    self.recorder = recorder
+    self.stats = {request_class['name']: ClassStats() for request_class in workload['classes']}
+    self.lock = threading.Lock()
+
+  def send(self, session, request_class, worker, scheduled):
+    def mask():
+      return utils.mask_file(session, request_class['file_path'], request_class['context'],
+                             request_class['media_type'], f'{self.folder_name}/{request_class["name"]}/worker-{worker}',
+                             compression=self.compression)
+
+    if self.recorder is not None:
+      mask = self.recorder.wrap(mask, request_class['file_path'], request_class['media_type'],
+                                request_class['context'], self.compression)
+    started = time.perf_counter()
+    try:
+      mask()
+      error = None
+    except Exception as e:
+      error = e
+    finished = time.perf_counter()
+    with self.lock:
+      stats = self.stats[request_class['name']]
+      if error is not None:
+        if not stats.errors:
+          logging.error(f'{request_class["name"]}: {error}')
+        stats.errors += 1
+        return
+      stats.requests += 1
+      stats.bytes += request_class['bytes']
+      stats.latency.record(finished - scheduled)
+      stats.queue_wait.record(started - scheduled)
+
+  def closed_loop(self, worker, end):
+    chooser = Chooser(self.workload['classes'], self.workload['seed'] + worker)
+    with requests.Session() as session:
+      while time.perf_counter() < end:
+        self.send(session, chooser.choose(), worker, time.perf_counter())
+
+  def open_loop_worker(self, worker, pending):
+    with requests.Session() as session:
+      item = pending.get()
+      while item is not None:
+        request_class, scheduled = item
+        self.send(session, request_class, worker, scheduled)
+        item = pending.get()
+
+  # Yields (offset in seconds, request class) at the workload's arrival rate until the end of
+  # its duration.
+  def arrivals(self):
+    arrival = self.workload['arrival']
+    rate = arrival['rate']
+    poisson = arrival.get('pattern', 'fixed') == 'poisson'
+    rng = random.Random(self.workload['seed'])
+    chooser = Chooser(self.workload['classes'], self.workload['seed'])
+    offset = 0.0
+    while offset < self.workload['duration']:
+      yield offset, chooser.choose()
+      offset += rng.expovariate(rate) if poisson else 1 / rate
+
+  def schedule(self, pending, start, arrivals):
+    for offset, request_class in arrivals:
+      scheduled = start + offset
+      time.sleep(max(scheduled - time.perf_counter(), 0))
+      pending.put((request_class, scheduled))
+
+  def run(self, arrivals=None):
+    concurrency = self.workload['concurrency']
+    start = time.perf_counter()
+    end = start + self.workload['duration']
+    if arrivals is None and self.workload['arrival']:
+      arrivals = self.arrivals()
+    if arrivals is not None:
+      pending = queue.Queue()
+      threads = [threading.Thread(target=self.open_loop_worker, args=(i, pending), name=f'worker-{i}')
+                 for i in range(concurrency)]
+      for thread in threads:
+        thread.start()
+      self.schedule(pending, start, arrivals)
+      for _ in threads:
+        pending.put(None)
+    else:
+      threads = [threading.Thread(target=self.closed_loop, args=(i, end), name=f'worker-{i}')
+                 for i in range(concurrency)]
+      for thread in threads:
+        thread.start()
+    for thread in threads:
+      thread.join()
+    self.elapsed = time.perf_counter() - start
+    return self.stats
@@ -0,0 +1,127 @@
+import argparse
+import json
+import logging
+import os
+import random
+import requests
+import string
+import sys
+import time
+
+# Append parent directory to PYTHON_PATH so we can import utils.py
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from setup import setup, teardown, file_mask_context_name, file_search_context_name
+
+import utils
+
+media_types = {'txt': 'text/plain', 'csv': 'text/csv', 'json': 'application/json'}
+
+
+# A unique upper case name for each index: the index in base 26 as the first name,
+# followed by a random last name.
+def entry(i, rng):
+  first = ''
+  while True:
+    first = string.ascii_uppercase[i % 26] + first
+    i //= 26
+    if not i:
+      break
+  last = ''.join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(4, 9)))
+  return f'{first.rjust(3, "A")} {last}'
+
+
+def create_set_file(folder, entries, seed):
+  path = f'{folder}/names-{entries}.set'
+  if not os.path.exists(path):
+    logging.info(f'Creating {path}...')
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+      for i in range(entries):
+        f.write(entry(i, rng))
+        f.write(os.linesep)
+    logging.info(f'Created {path}.')
+  return path
+
+
+# Writes a payload of about file_size KB of 1 KB records, each with one name drawn from the
+# set file, so that every payload has the same number of hits whatever the set size.
+def create_payload(folder, extension, file_size, names):
+  path = f'{folder}/test-{file_size}.{extension}'
+  filler = 'x' * 900
+  with open(path, 'w') as f:
+    if extension == 'json':
+      f.write(f'[{os.linesep}')
+    for i in range(file_size):
+      name = names[i % len(names)]
+      if extension == 'txt':
+        f.write(f'{filler} {name}{os.linesep}')
+      elif extension == 'csv':
+        f.write(f'{i},{name},{filler}{os.linesep}')
+      else:
+        separator = ',' if i < file_size - 1 else ''
+        f.write(f'  {json.dumps({"id": i, "name": name, "data": filler})}{separator}{os.linesep}')
+    if extension == 'json':
+      f.write(f']{os.linesep}')
+  return path
+
+
+if __name__ == '__main__':
+  logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+  parser = argparse.ArgumentParser(description=('Benchmark search/masking as the set matcher dictionary grows. The '
+                                                'contexts are always recreated for each set size, since their create '
+                                                'time is measured, so --keep-contexts has no effect.'))
+  parser.add_argument('entries', type=int, help='The max number of set entries. Runs 1, 10, 100, ... up to this number.')
+  parser.add_argument('-s', '--size', metavar='KB', type=int, default=1000, help='The size of each test file in kbs. Defaults to 1000.')
+  parser.add_argument('-f', '--formats', metavar='LIST', type=lambda value: value.split(','), default=sorted(media_types),
+                      help='Comma separated list of test file formats (csv, json, txt). Defaults to all.')
+  parser.add_argument('-i', '--iterations', metavar='N', type=int, default=10, help='The number of times the test should be run to obtain the average. Defaults to 10.')
+  parser.add_argument('--seed', type=int, default=0, help='Seed for the generated set entries. Defaults to 0.')
+  utils.add_benchmark_arguments(parser)
+
+  args = parser.parse_args()
+  if args.keep_contexts:
+    logging.warning('Ignoring --keep-contexts, the contexts are recreated for each set size to measure their create time.')
+  test_folder = 'test-files'
+  os.makedirs(test_folder, exist_ok=True)
+  levels = []
+  entries = 1
+  while entries < args.entries:
+    levels.append(entries)
+    entries *= 10
+  levels.append(args.entries)
+  context = json.dumps({
+      "fileSearchContextName": file_search_context_name,
+      "fileMaskContextName": file_mask_context_name
+  })
+  rows = []
+  with requests.Session() as session:
+    for entries in levels:
+      set_path = create_set_file(test_folder, entries, args.seed)
+      with open(set_path) as f:
+        names = [line.strip() for line in f if line.strip()][:args.size]
+      start = time.perf_counter()
+      setup(session, set_path)
+      create_time = time.perf_counter() - start
+      logging.info(f'{entries} entries: created contexts in {create_time:.4f} seconds.')
+      row = {'entries': entries, 'createTime': create_time}
+      try:
+        for extension in args.formats:
+          file_path = create_payload(test_folder, extension, args.size, names)
+          results = utils.benchmark_search_mask(session, file_path, context, f'set-{entries}/{extension}',
+                                                media_types[extension], args.iterations, records=args.size,
+                                                **utils.benchmark_options(args))
+          row[extension] = {
+            'megabytesPerSecond': results['throughput']['megabytesPerSecond'],
+            'recordsPerSecond': results['throughput']['recordsPerSecond'],
+            'p50': results['latency']['p50'],
+            'p99': results['latency']['p99']
+          }
+          logging.info(f'{entries} entries, {extension}: {row[extension]["megabytesPerSecond"]:.3f} MB/s, '
+                       f'p99 {row[extension]["p99"]:.4f} seconds.')
+      finally:
+        teardown(session)
+      rows.append(row)
+  utils.write_results('results/set-scaling', rows)
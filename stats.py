@@ -0,0 +1,177 @@
+import math
+
+# Latency values are recorded as integer counts of microseconds.
+resolution = 1000000
+percentiles = [50, 90, 99, 99.9]
+
+
+# An HDR-style latency histogram. Values are bucketed on a log-linear scale where each
+# power of two is split into 2 ** (significant_bits - 1) buckets, which bounds the relative
+# error of any reported percentile to 2 ** -(significant_bits - 1) regardless of magnitude.
+# Only non-empty buckets are stored, and two histograms with the same significant_bits can
+# be merged by adding their counts, so runs from several workers or processes can be
+# combined without keeping the raw samples.
+class Histogram():
+
+  def __init__(self, significant_bits=8):
+    self.significant_bits = significant_bits
+    self.counts = {}
+    self.count = 0
+    self.total = 0.0
+    self.total_squares = 0.0
+    self.min = None
+    self.max = None
+
+  def _key(self, value):
+    shift = max(value.bit_length() - self.significant_bits, 0)
+    return (shift << self.significant_bits) + (value >> shift)
+
+  def _highest_equivalent(self, key):
+    shift = key >> self.significant_bits
+    bucket = key & ((1 << self.significant_bits) - 1)
+    return ((bucket + 1) << shift) - 1
+
+  def record(self, seconds, count=1):
+    value = max(int(round(seconds * resolution)), 0)
+    key = self._key(value)
+    self.counts[key] = self.counts.get(key, 0) + count
+    self.count += count
+    self.total += seconds * count
+    self.total_squares += seconds * seconds * count
+    self.min = seconds if self.min is None else min(self.min, seconds)
+    self.max = seconds if self.max is None else max(self.max, seconds)
+
+  def merge(self, other):
+    if other.significant_bits != self.significant_bits:
+      raise ValueError('Cannot merge histograms with different significant_bits.')
+    for key, count in other.counts.items():
+      self.counts[key] = self.counts.get(key, 0) + count
+    self.count += other.count
+    self.total += other.total
+    self.total_squares += other.total_squares
+    if other.min is not None:
+      self.min = other.min if self.min is None else min(self.min, other.min)
+      self.max = other.max if self.max is None else max(self.max, other.max)
+    return self
+
+  def percentile(self, p):
+    if not self.count:
+      return None
+    # Rounded first so that float error, e.g. 99.9 / 100 * 1000 = 999.0000000000001, cannot
+    # push the rank up by one.
+    target = max(math.ceil(round(p * self.count / 100, 9)), 1)
+    seen = 0
+    for key in sorted(self.counts):
+      seen += self.counts[key]
+      if seen >= target:
+        return min(max(self._highest_equivalent(key) / resolution, self.min), self.max)
+    return self.max
+
+  def mean(self):
+    return self.total / self.count if self.count else None
+
+  def stdev(self):
+    if not self.count:
+      return None
+    mean = self.mean()
+    return math.sqrt(max(self.total_squares / self.count - mean * mean, 0))
+
+  def summary(self):
+    summary = {
+      'count': self.count,
+      'min': self.min,
+      'max': self.max,
+      'mean': self.mean(),
+      'stdev': self.stdev()
+    }
+    for p in percentiles:
+      summary[f'p{p:g}'] = self.percentile(p)
+    return summary
+
+  def to_dict(self):
+    return {
+      'significantBits': self.significant_bits,
+      'counts': {str(key): count for key, count in self.counts.items()},
+      'count': self.count,
+      'total': self.total,
+      'totalSquares': self.total_squares,
+      'min': self.min,
+      'max': self.max
+    }
+
+  @classmethod
+  def from_dict(cls, data):
+    histogram = cls(data['significantBits'])
+    histogram.counts = {int(key): count for key, count in data['counts'].items()}
+    histogram.count = data['count']
+    histogram.total = data['total']
+    histogram.total_squares = data['totalSquares']
+    histogram.min = data['min']
+    histogram.max = data['max']
+    return histogram
+
+
+# Writes the percentile lines of a histogram to a text report.
+def write_percentiles(f, histogram, linesep, indent=''):
+  for p in percentiles:
+    f.write(f'{indent}p{p:g}: {histogram.percentile(p)} seconds{linesep}')
+
+
+# Fits y = intercept + slope * x by least squares. Returns (intercept, slope), or None when
+# there are fewer than two distinct values of x.
+def linear_fit(xs, ys):
+  if len(set(xs)) < 2:
+    return None
+  n = len(xs)
+  mean_x = sum(xs) / n
+  mean_y = sum(ys) / n
+  covariance = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+  variance = sum((x - mean_x) ** 2 for x in xs)
+  slope = covariance / variance
+  return mean_y - slope * mean_x, slope
+
+
+# Fits the Universal Scalability Law X(N) = lambda * N / (1 + sigma * (N - 1) + kappa * N * (N - 1))
+# to the throughput measured at each concurrency level N, where sigma is the contention
+# and kappa the coherency penalty. Lambda is the throughput of a single worker, taken from
+# the lowest level. Returns (lambda, sigma, kappa, peak) where peak is the concurrency at
+# which the fitted throughput is highest (None if it keeps rising).
+def usl_fit(levels, throughputs):
+  lowest = min(range(len(levels)), key=lambda i: levels[i])
+  single = throughputs[lowest] / levels[lowest]
+  # Linearised as N / C(N) - 1 = sigma * (N - 1) + kappa * N * (N - 1), with C(N) = X(N) / lambda,
+  # and solved by least squares without an intercept.
+  aa = ab = bb = ay = by = 0.0
+  for n, throughput in zip(levels, throughputs):
+    if not throughput:
+      continue
+    a = n - 1
+    b = n * (n - 1)
+    y = n * single / throughput - 1
+    aa += a * a
+    ab += a * b
+    bb += b * b
+    ay += a * y
+    by += b * y
+  determinant = aa * bb - ab * ab
+  if not determinant:
+    return single, 0.0, 0.0, None
+  sigma = max((ay * bb - by * ab) / determinant, 0.0)
+  kappa = max((aa * by - ab * ay) / determinant, 0.0)
+  peak = math.sqrt((1 - sigma) / kappa) if kappa and sigma < 1 else None
+  return single, sigma, kappa, peak
+
+
+# Finds the knee of a concurrency sweep: the last level before adding workers stops paying
+# off, either because the throughput gained is less than 'efficiency' of what linear scaling
+# would give, or because the latency grows by more than 'latency_growth' times at once.
+# Levels must be in ascending order.
+def find_knee(levels, throughputs, latencies, efficiency=0.25, latency_growth=2.0):
+  for i in range(1, len(levels)):
+    ideal_gain = levels[i] / levels[i - 1] - 1
+    throughput_gain = throughputs[i] / throughputs[i - 1] - 1 if throughputs[i - 1] else 0
+    if throughput_gain < efficiency * ideal_gain:
+      return levels[i - 1]
+    if latencies[i - 1] and latencies[i] / latencies[i - 1] > latency_growth:
+      return levels[i - 1]
+  return levels[-1]
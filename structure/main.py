@@ -0,0 +1,110 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import requests
+import sys
+
+# Append parent directory to PYTHON_PATH so we can import utils.py
+current_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from setup import setup, teardown, file_mask_context_name, file_search_context_name
+
+import generator
+import utils
+
+media_types = {'xml': 'application/xml', 'json': 'application/json'}
+
+
+def int_list(value):
+  return [int(item) for item in value.split(',')]
+
+
+def on_off_list(value):
+  return [item == 'on' for item in value.split(',')]
+
+
+# The number of elements (xml) or objects (json) in one record tree.
+def nodes(depth, fanout):
+  return sum(fanout ** level for level in range(depth + 1))
+
+
+# The shapes to run for a format. Attributes and namespaces only apply to xml.
+def shapes(format, args):
+  if format == 'xml':
+    return [dict(zip(['depth', 'fanout', 'attributes', 'namespaces', 'value_length'], shape))
+            for shape in itertools.product(args.depth, args.fanout, args.attributes, args.namespaces,
+                                           args.value_length)]
+  return [{'width': 1, 'depth': depth, 'fanout': fanout, 'value_length': value_length}
+          for depth, fanout, value_length in itertools.product(args.depth, args.fanout, args.value_length)]
+
+
+# Sweeps document shapes at a fixed file size, since the cost of parsing a document depends
+# on its structure as well as its size.
+if __name__ == '__main__':
+  logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+  parser = argparse.ArgumentParser(description='Benchmark xml and json search/masking across document structures of the same size.')
+  parser.add_argument('file_size', type=int, help='The size of the test files in kbs.')
+  parser.add_argument('-f', '--formats', metavar='LIST', type=lambda value: value.split(','), default=sorted(media_types),
+                      help='Comma separated list of test file formats (json, xml). Defaults to both.')
+  parser.add_argument('--depth', metavar='LIST', type=int_list, default=[1, 4],
+                      help='Comma separated list of tree depths. Defaults to 1,4.')
+  parser.add_argument('--fanout', metavar='LIST', type=int_list, default=[2],
+                      help='Comma separated list of the number of children of each element. Defaults to 2.')
+  parser.add_argument('--attributes', metavar='LIST', type=on_off_list, default=[False],
+                      help='Comma separated list of whether xml values are attributes instead of text nodes (on, off). Defaults to off.')
+  parser.add_argument('--namespaces', metavar='LIST', type=int_list, default=[0],
+                      help='Comma separated list of the number of xml namespaces. Defaults to 0.')
+  parser.add_argument('--value-length', metavar='LIST', type=int_list, default=[14],
+                      help='Comma separated list of the length of each value. Defaults to 14, the length of the test value.')
+  parser.add_argument('-i', '--iterations', metavar='N', type=int, default=10, help='The number of times the test should be run to obtain the average. Defaults to 10.')
+  utils.add_benchmark_arguments(parser)
+
+  args = parser.parse_args()
+  rows = []
+  with requests.Session() as session:
+    cache = utils.context_cache(session, args)
+    try:
+      setup(session, cache)
+      context = json.dumps({
+          "fileSearchContextName": file_search_context_name,
+          "fileMaskContextName": file_mask_context_name
+      })
+      for format in args.formats:
+        for shape in shapes(format, args):
+          try:
+            layout = generator.layouts[format](args.file_size, **shape)
+          except ValueError as e:
+            logging.warning(f'Skipping {format} shape {shape}: {e}')
+            continue
+          file_path = generator.test_file(format, args.file_size, **shape)
+          records = layout.records
+          label = '-'.join(f'{key.replace("_", "-")}{int(value)}' for key, value in shape.items() if key != 'width')
+          results = utils.benchmark_search_mask(session, file_path, context, f'{args.file_size}/{format}/{label}',
+                                                media_types[format], args.iterations, records=records,
+                                                **utils.benchmark_options(args))
+          row = {
+            'format': format,
+            'depth': shape['depth'],
+            'fanout': shape['fanout'],
+            'attributes': shape.get('attributes', False),
+            'namespaces': shape.get('namespaces', 0),
+            'valueLength': shape['value_length'],
+            'bytes': os.path.getsize(file_path),
+            'records': records,
+            'nodes': records * nodes(shape['depth'], shape['fanout']),
+            'megabytesPerSecond': results['throughput']['megabytesPerSecond'],
+            'recordsPerSecond': results['throughput']['recordsPerSecond'],
+            'p50': results['latency']['p50'],
+            'p99': results['latency']['p99']
+          }
+          row['nodesPerSecond'] = row['nodes'] / results['latency']['mean']
+          logging.info(f'{format} {label}: {row["megabytesPerSecond"]:.3f} MB/s, '
+                       f'{row["nodesPerSecond"]:.1f} nodes/s, p99 {row["p99"]:.4f} seconds.')
+          rows.append(row)
+    finally:
+      teardown(session, cache)
+  utils.write_results(f'results/{args.file_size}', rows, 'structure')
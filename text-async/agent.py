@@ -0,0 +1,42 @@
+import argparse
+import asyncio
+import logging
+import time
+
+from aiohttp import web
+
+import async_utils
+import driver
+
+
+# Runs a plan sent by the coordinator and responds with the resulting stats. The plan names
+# the number of lines of the test file rather than a path, and the test file is created
+# locally if needed.
+async def run_handler(request):
+    data = await request.json()
+    plan = data['plan']
+    plan['file_path'], plan['file_name'] = async_utils.create_test_file(data['lines'])
+    processes = request.app['processes']
+    logging.info(f'Received {plan["mode"]} plan, starting in {plan["start_at"] - time.time():.3f} seconds...')
+    if processes > 1:
+        loop = asyncio.get_running_loop()
+        stats = await loop.run_in_executor(None, driver.run_processes, plan, processes)
+    else:
+        stats = await driver.run_standalone(plan)
+    logging.info(f'Completed {stats.files} files.')
+    return web.json_response(stats.to_dict())
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Load generation agent for coordinated multi-host benchmarks.')
+    parser.add_argument('--host', type=str, default='0.0.0.0', help='The interface to listen on. Defaults to 0.0.0.0.')
+    parser.add_argument('--port', type=int, default=8970, help='The port to listen on. Defaults to 8970.')
+    parser.add_argument('-p', '--processes', metavar='N', type=int, default=1,
+                        help='The number of client processes to divide this agent\'s load between. The default is 1.')
+
+    args = parser.parse_args()
+    app = web.Application()
+    app['processes'] = args.processes
+    app.router.add_post('/run', run_handler)
+    web.run_app(app, host=args.host, port=args.port)
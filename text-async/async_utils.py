@@ -1,8 +1,13 @@
+import asyncio
+import heapq
+import json
 import logging
 import os
+import random
 import aiohttp
 import aiofiles
 import sys
+import time
 
 # Append parent directory to PYTHON_PATH so we can import utils.py
 current_dir = os.path.dirname(os.path.realpath(__file__))
@@ -10,6 +15,9 @@ parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
 from server_config import hostname, port, is_https
+import generator
+from stats import Histogram, percentiles
+import tracing
 
 host = f'http{"s" if is_https else ""}://{hostname}:{port}/api/darkshield'
 
@@ -27,37 +35,311 @@ async def destroy_context(session, context, name):
     await session.post(url, json={'name': name})
 
 
+# Creates the text file of 1 KB lines used for the test if it doesn't exist yet.
+def create_test_file(lines, test_folder='test-files'):
+    file_name = f'test-{lines}.txt'
+    file_path = generator.test_file('txt', lines, folder=f'{test_folder}/cache')
+    return file_path, file_name
+
+
+# Streams a file from disk in chunks so that only one chunk per request is held in memory.
+async def file_sender(file_path, chunk_size):
+    async with aiofiles.open(file_path, 'rb') as f:
+        chunk = await f.read(chunk_size)
+        while chunk:
+            yield chunk
+            chunk = await f.read(chunk_size)
+
+
+# Sinks receive a part of the mask response chunk by chunk, so that at most one chunk
+# per part is held in memory no matter how large the masked file is.
+class FileSink():
+
+    def __init__(self, path):
+        self.path = path
+        self.size = 0
+        self.f = None
+
+    async def open(self):
+        self.f = await aiofiles.open(self.path, 'wb')
+
+    async def write(self, chunk):
+        self.size += len(chunk)
+        await self.f.write(chunk)
+
+    async def close(self):
+        await self.f.close()
+
+
+# Counts and discards the response, to measure the client without its disk I/O.
+class NullSink():
+
+    def __init__(self, path):
+        self.path = path
+        self.size = 0
+
+    async def open(self):
+        pass
+
+    async def write(self, chunk):
+        self.size += len(chunk)
+
+    async def close(self):
+        pass
+
+
+sinks = {'file': FileSink, 'null': NullSink}
+
+
+async def stream_part(part, sink, chunk_size):
+    await sink.open()
+    try:
+        chunk = await part.read_chunk(chunk_size)
+        while chunk:
+            await sink.write(chunk)
+            chunk = await part.read_chunk(chunk_size)
+    finally:
+        await sink.close()
+
+
+# Sends a single file to the API. If shared_buffer is given, that pre-encoded bytes object
+# is sent as the body of the request instead of streaming file_path from disk. The 'file'
+# and 'results' parts of the response are streamed into sinks created by sink. With a
+# recorder, the phases of the request are recorded on 'track' (see tracing.RequestSpans).
+async def mask_file_async(session, context, file_path, file_name, file_size, index,
+                          chunk_size=65536, shared_buffer=None, sink=FileSink, media_type='text/plain',
+                          recorder=None, track=None, **span_args):
+    folder_name = f'results/{file_size}'
+    file_folder_name = f'files/{file_size}'
+    url = f'{host}/files/fileSearchContext.mask'
+    os.makedirs(folder_name, exist_ok=True)
+    os.makedirs(file_folder_name, exist_ok=True)
+    spans = tracing.RequestSpans(recorder, track, file=index, **span_args)
+    if shared_buffer is None:
+        body = file_sender(file_path, chunk_size)
+        if recorder is not None:
+            body = spans.body(body)
+    else:
+        body = shared_buffer
+    data = aiohttp.FormData()
+    data.add_field('context', context,
+                   filename='context',
+                   content_type='application/json')
+    data.add_field('file', body,
+                   filename=file_name,
+                   content_type=media_type)
+    async with session.post(url, data=data) as r:
+        spans.response_started()
+        if r.status >= 300:
+            spans.end(status=r.status)
+            raise Exception(f"Failed with status {r.status}:\n\n{await r.json()}")
+        reader = aiohttp.MultipartReader.from_response(r)
+        part = await reader.next()
+        while part is not None:
+            if part.name == 'file':
+                with tracing.span(recorder, track, 'file part'):
+                    await stream_part(part, sink(f'{file_folder_name}/{file_name}_{index}'), chunk_size)
+            elif part.name == 'results':
+                with tracing.span(recorder, track, 'results part'):
+                    await stream_part(part, sink(f'{folder_name}/{file_name}_{index}_results.json'), chunk_size)
+            part = await reader.next()
+    spans.end(status=r.status)
+
+
+# The timings of every file processed in a run. The time a file spends waiting in the queue
+# for a free worker and the time a worker spends on it (service time) add up to its
+# end-to-end time. Stats from several runs, workers or processes can be merged. The wall
+# clock times of the first and last completions give the rate at which responses came back,
+# which unlike files / elapsed doesn't include the latency of the first and last requests.
+class RunStats():
+
+    def __init__(self):
+        self.queue_wait = Histogram()
+        self.service = Histogram()
+        self.end_to_end = Histogram()
+        self.files = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+        self.first_completed = None
+        self.last_completed = None
+
+    def record(self, queue_wait, service, size):
+        self.queue_wait.record(queue_wait)
+        self.service.record(service)
+        self.end_to_end.record(queue_wait + service)
+        self.files += 1
+        self.bytes += size
+        completed = time.time()
+        self.first_completed = min(self.first_completed or completed, completed)
+        self.last_completed = max(self.last_completed or completed, completed)
+
+    def completions_per_second(self):
+        if self.files < 2 or self.last_completed <= self.first_completed:
+            return None
+        return (self.files - 1) / (self.last_completed - self.first_completed)
+
+    def merge(self, other):
+        self.queue_wait.merge(other.queue_wait)
+        self.service.merge(other.service)
+        self.end_to_end.merge(other.end_to_end)
+        self.files += other.files
+        self.bytes += other.bytes
+        self.elapsed = max(self.elapsed, other.elapsed)
+        if other.first_completed is not None:
+            self.first_completed = min(self.first_completed or other.first_completed, other.first_completed)
+            self.last_completed = max(self.last_completed or other.last_completed, other.last_completed)
+        return self
+
+    def summary(self):
+        return {
+            'files': self.files,
+            'bytes': self.bytes,
+            'elapsed': self.elapsed,
+            'filesPerSecond': self.files / self.elapsed if self.elapsed else None,
+            'megabytesPerSecond': self.bytes / self.elapsed / 1e6 if self.elapsed else None,
+            'completionsPerSecond': self.completions_per_second(),
+            'queueWait': self.queue_wait.summary(),
+            'service': self.service.summary(),
+            'endToEnd': self.end_to_end.summary()
+        }
+
+    def to_dict(self):
+        return {
+            'files': self.files,
+            'bytes': self.bytes,
+            'elapsed': self.elapsed,
+            'firstCompleted': self.first_completed,
+            'lastCompleted': self.last_completed,
+            'queueWait': self.queue_wait.to_dict(),
+            'service': self.service.to_dict(),
+            'endToEnd': self.end_to_end.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.files = data['files']
+        stats.bytes = data['bytes']
+        stats.elapsed = data['elapsed']
+        stats.first_completed = data.get('firstCompleted')
+        stats.last_completed = data.get('lastCompleted')
+        stats.queue_wait = Histogram.from_dict(data['queueWait'])
+        stats.service = Histogram.from_dict(data['service'])
+        stats.end_to_end = Histogram.from_dict(data['endToEnd'])
+        return stats
+
+
+# Workers take (index, file path, enqueue time) items off the queue, send them to the API
+# and record their timings in stats. With a recorder, each worker has its own track, with
+# the time it spends waiting for the next file recorded as 'idle'.
 async def benchmark_search_mask_async(session, file_name, context, file_size, i,
-                                      queue):
+                                      queue, stats, chunk_size=65536, shared_buffer=None, sink=FileSink,
+                                      recorder=None):
     logging.info(f': Task{i} started.')
+    track = f'worker-{i}'
     while True:
-        folder_name = f'results/{file_size}'
-        file_folder_name = f'files/{file_size}'
-        url = f'{host}/files/fileSearchContext.mask'
-        os.makedirs(folder_name, exist_ok=True)
-        os.makedirs(file_folder_name, exist_ok=True)
-        f = await queue.get()
-        data = aiohttp.FormData()
-        data.add_field('context', context,
-                       filename='context',
-                       content_type='application/json')
-        data.add_field('file', f,
-                       filename=file_name,
-                       content_type='text/plain')
-        async with session.post(url, data=data) as r:
-            if r.status >= 300:
-                raise Exception(f"Failed with status {r.status}:\n\n{await r.json()}")
-            reader = aiohttp.MultipartReader.from_response(r)
-            part = await reader.next()
-            file_response = await aiofiles.open(f'{file_folder_name}/{file_name}_{i}', 'wb')
-            results_response = await aiofiles.open(f'{folder_name}/{file_name}_{i}_results.json', 'wb')
-            while part is not None:
-                if part.name == 'file':
-                    filedata = await part.read(decode=False)
-                    await file_response.write(bytearray(filedata))
-                elif part.name == 'results':
-                    resultsdata = await part.read(decode=False)
-                    await results_response.write(bytearray(resultsdata))
-                part = await reader.next()
+        with tracing.span(recorder, track, 'idle'):
+            index, file_path, enqueued = await queue.get()
+        started = time.perf_counter()
+        await mask_file_async(session, context, file_path, file_name, file_size, index,
+                              chunk_size, shared_buffer, sink, recorder=recorder, track=track,
+                              queueWait=started - enqueued)
+        stats.record(started - enqueued, time.perf_counter() - started, os.path.getsize(file_path))
         queue.task_done()
-        logging.info(f': Task{i} completed.')
+        logging.info(f': Task{i} completed file {index}.')
+
+
+# Runs number_files copies of file_path through a pool of exactly 'workers' workers.
+# All files are queued up front, so queue wait is the time spent waiting for a free worker.
+async def run_pool(session, context, file_path, file_name, file_size, workers, number_files,
+                   chunk_size=65536, shared_buffer=None, sink=FileSink, recorder=None):
+    stats = RunStats()
+    queue = asyncio.Queue()
+    start = time.perf_counter()
+    for index in range(number_files):
+        queue.put_nowait((index, file_path, start))
+    tasks = [asyncio.create_task(benchmark_search_mask_async(session, file_name, context, file_size, i,
+                                                             queue, stats, chunk_size, shared_buffer, sink,
+                                                             recorder))
+             for i in range(workers)]
+    join = asyncio.ensure_future(queue.join())
+    try:
+        # wait for either `queue.join()` to complete or a consumer to raise
+        done, _ = await asyncio.wait([join, *tasks], return_when=asyncio.FIRST_COMPLETED)
+        error_raised = set(done) & set(tasks)
+        if error_raised:
+            await error_raised.pop()  # propagate the exception
+    finally:
+        logging.info('Stopping workers...')
+        join.cancel()
+        for task in tasks:
+            task.cancel()
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+
+# Issues requests on a fixed or Poisson schedule at 'rate' requests per second for 'duration'
+# seconds, without waiting for earlier requests to complete. Latency is measured from the
+# scheduled send time, so delays caused by earlier slow requests are counted rather than
+# hidden (coordinated omission). Queue wait is the time between the scheduled and the actual
+# send time. Fixed arrivals are scheduled at start + n / rate, so that float error can't
+# add a request. With a recorder, each request in flight takes the lowest free 'slot' track, so
+# the number of tracks in use shows the number of requests in flight.
+async def run_open_loop(session, context, file_path, file_name, file_size, rate, duration,
+                        arrival='fixed', seed=None, chunk_size=65536, shared_buffer=None, sink=FileSink,
+                        recorder=None):
+    stats = RunStats()
+    size = os.path.getsize(file_path)
+    rng = random.Random(seed)
+    free_slots = []
+    slots = 0
+
+    async def send(index, scheduled):
+        nonlocal slots
+        started = time.perf_counter()
+        if free_slots:
+            slot = heapq.heappop(free_slots)
+        else:
+            slot = slots
+            slots += 1
+        try:
+            await mask_file_async(session, context, file_path, file_name, file_size, index,
+                                  chunk_size, shared_buffer, sink, recorder=recorder, track=f'slot-{slot}',
+                                  sendDelay=started - scheduled)
+        finally:
+            heapq.heappush(free_slots, slot)
+        stats.record(started - scheduled, time.perf_counter() - started, size)
+
+    tasks = []
+    start = time.perf_counter()
+    offset = 0.0
+    while offset < duration:
+        delay = start + offset - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(len(tasks), start + offset)))
+        offset = offset + rng.expovariate(rate) if arrival == 'poisson' else len(tasks) / rate
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+
+def log_summary(summary):
+    logging.info(f'Files: {summary["files"]} in {summary["elapsed"]:.3f} seconds')
+    logging.info(f'Throughput: {summary["filesPerSecond"]:.3f} files/s, {summary["megabytesPerSecond"]:.3f} MB/s')
+    for name in ('queueWait', 'service', 'endToEnd'):
+        latency = summary[name]
+        logging.info(f'{name}: mean {latency["mean"]:.4f}, ' +
+                     ', '.join(f'p{p:g} {latency[f"p{p:g}"]:.4f}' for p in percentiles) + ' seconds')
+
+
+def write_report(folder_name, results, name='async_benchmarks'):
+    os.makedirs(folder_name, exist_ok=True)
+    results_file = f'{folder_name}/{name}.json'
+    with open(results_file, 'w') as f:
+        json.dump(results, f, indent=2)
+    logging.info(f'Written out {results_file}.')
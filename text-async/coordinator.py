@@ -0,0 +1,107 @@
+import aiohttp
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import time
+
+import async_utils
+import driver
+
+from setup import setup, teardown, file_mask_context_name, file_search_context_name
+
+
+# Sends each agent its share of the plan, and merges the stats they respond with. Returns the
+# merged stats and the stats of each agent that was given a share.
+async def run_agents(session, agents, plan, lines):
+    plans = driver.split_plan(plan, len(agents), name='agent')
+    agents = agents[:len(plans)]
+
+    async def run_agent(agent, agent_plan):
+        url = f'http://{agent}/run'
+        logging.info(f'POST: {url}')
+        async with session.post(url, json={'plan': agent_plan, 'lines': lines}, raise_for_status=True) as r:
+            return async_utils.RunStats.from_dict(await r.json())
+
+    results = await asyncio.gather(*[run_agent(agent, agent_plan) for agent, agent_plan in zip(agents, plans)])
+    stats = async_utils.RunStats()
+    for agent, agent_stats in zip(agents, results):
+        logging.info(f'{agent}: {agent_stats.files} files in {agent_stats.elapsed:.3f} seconds.')
+        stats.merge(agent_stats)
+    return stats, dict(zip(agents, results))
+
+
+async def main(arguments):
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=0)) as session:
+        try:
+            await setup(session, arguments.buffer_limit)
+            context = json.dumps({
+                "fileSearchContextName": file_search_context_name,
+                "fileMaskContextName": file_mask_context_name
+            })
+            plan = {
+                'mode': 'open_loop' if arguments.rate else 'pool',
+                'context': context,
+                'label': str(arguments.lines),
+                'workers': arguments.workers,
+                'number_files': arguments.number_files,
+                'rate': arguments.rate,
+                'duration': arguments.duration,
+                'arrival': arguments.arrival,
+                'seed': arguments.seed,
+                'chunk_size': arguments.chunk_size,
+                'shared_buffer': arguments.shared_buffer,
+                'sink': arguments.sink,
+                'start_at': time.time() + arguments.start_delay
+            }
+            logging.info(f'Start time: {datetime.datetime.fromtimestamp(plan["start_at"])}')
+            stats, results = await run_agents(session, arguments.agents, plan, arguments.lines)
+            summary = stats.summary()
+            async_utils.log_summary(summary)
+            # A closed-loop run is only complete if every planned file was sent.
+            complete = bool(arguments.rate) or stats.files == arguments.number_files
+            if not complete:
+                logging.error(f'Only {stats.files} of the {arguments.number_files} planned files were processed.')
+            async_utils.write_report(f'results/{arguments.lines}', {
+                'lines': arguments.lines,
+                'plan': plan,
+                'complete': complete,
+                'agents': {agent: agent_stats.summary() for agent, agent_stats in results.items()},
+                **summary,
+                'histograms': stats.to_dict()
+            }, name='distributed')
+        finally:
+            await teardown(session)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Coordinate a text file search/masking benchmark across agents.')
+    parser.add_argument('lines', type=int,
+                        help='The number of text lines to create for the test file. Each line is 1kb in size.')
+    parser.add_argument('agents', nargs='+', metavar='host:port', help='The agents to run the benchmark on.')
+    parser.add_argument('-n', '--number-files', metavar='N', type=int, default=10,
+                        help='The total number of files to use across all agents. Defaults to 10.')
+    parser.add_argument('-b', '--buffer-limit', metavar='N', type=int,
+                        help='Set the buffer limit to use for the text file in memory-constrained environments.')
+    parser.add_argument('-w', '--workers', metavar='N', type=int, default=4,
+                        help='The total number of workers across all agents. The default number is 4.')
+    parser.add_argument('-r', '--rate', metavar='R', type=float,
+                        help='Run open-loop at a total target rate of R requests/s across all agents instead of using workers.')
+    parser.add_argument('-d', '--duration', metavar='S', type=float, default=10,
+                        help='How long to send requests for when using --rate in seconds. The default is 10.')
+    parser.add_argument('--arrival', choices=['fixed', 'poisson'], default='fixed',
+                        help='Send requests at fixed intervals or as a Poisson process. The default is fixed.')
+    parser.add_argument('--seed', type=int, help='Seed for the Poisson arrival schedule.')
+    parser.add_argument('-c', '--chunk-size', metavar='N', type=int, default=65536,
+                        help='The chunk size used to stream the test file to the API. The default is 65536.')
+    parser.add_argument('--shared-buffer', action='store_true',
+                        help='Send a single pre-encoded copy of the test file with every request.')
+    parser.add_argument('-s', '--sink', choices=sorted(async_utils.sinks), default='file',
+                        help='Where the agents stream the masked files and results. The default is file.')
+    parser.add_argument('--start-delay', metavar='S', type=float, default=5,
+                        help=('How many seconds from now the agents should start, to give the plan time to reach '
+                              'them. The default is 5.'))
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,115 @@
+import aiohttp
+import asyncio
+import logging
+import multiprocessing
+import time
+
+import async_utils
+import tracing
+
+# A plan describes one run of the benchmark as a JSON serializable dict, so that it can be
+# handed to other processes (or hosts). Its keys are:
+#   mode - 'pool' for a closed-loop worker pool, 'open_loop' for a target arrival rate
+#   context - the JSON context sent with each request
+#   file_path, file_name - the test file to send and the name to send it under
+#   label - the sub folder of results/ and files/ to write the responses to
+#   workers, number_files - the size of the worker pool and the number of files (pool)
+#   rate, duration, arrival, seed - the arrival schedule (open_loop)
+#   chunk_size, shared_buffer, sink - see main.py
+#   start_at - optional wall clock time (time.time()) to wait for before starting
+#   trace - optional, whether to record spans for a trace (see tracing.py)
+
+
+def partition(total, parts):
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+
+# Divides total in proportion to weights, giving the remainder to the largest fractions so
+# that the shares always add up to total.
+def proportion(total, weights):
+    weight = sum(weights)
+    shares = [total * w // weight for w in weights]
+    remainders = sorted(range(len(weights)), key=lambda i: total * weights[i] % weight, reverse=True)
+    for i in remainders[:total - sum(shares)]:
+        shares[i] += 1
+    return shares
+
+
+# Splits a plan into one plan per process, dividing the workers and files (or the arrival
+# rate) between them. Each process writes its responses to its own sub folder. A pool is
+# split across at most as many processes as it has workers, and the files are divided in
+# proportion to each process's workers, so that the number of files of the parts always
+# adds up to the plan's.
+def split_plan(plan, parts, name='process'):
+    if plan['mode'] != 'open_loop':
+        parts = max(min(parts, plan['workers']), 1)
+    workers = partition(plan['workers'], parts)
+    number_files = proportion(plan['number_files'], workers) if plan['workers'] else partition(plan['number_files'], parts)
+    plans = []
+    for i in range(parts):
+        part = dict(plan, workers=workers[i], number_files=number_files[i], label=f'{plan["label"]}/{name}-{i}')
+        if plan['mode'] == 'open_loop':
+            part['rate'] = plan['rate'] / parts
+            if plan.get('seed') is not None:
+                part['seed'] = plan['seed'] + i
+        elif not part['number_files']:
+            continue
+        plans.append(part)
+    return plans
+
+
+async def run_plan(session, plan, shared_buffer=None, recorder=None):
+    start_at = plan.get('start_at')
+    if start_at:
+        await asyncio.sleep(max(start_at - time.time(), 0))
+    sink = async_utils.sinks[plan['sink']]
+    if plan['mode'] == 'open_loop':
+        return await async_utils.run_open_loop(session, plan['context'], plan['file_path'], plan['file_name'],
+                                               plan['label'], plan['rate'], plan['duration'], plan['arrival'],
+                                               plan.get('seed'), plan['chunk_size'], shared_buffer, sink, recorder)
+    return await async_utils.run_pool(session, plan['context'], plan['file_path'], plan['file_name'],
+                                      plan['label'], plan['workers'], plan['number_files'], plan['chunk_size'],
+                                      shared_buffer, sink, recorder)
+
+
+# Runs a plan with its own connection pool. With a recorder, event loop stalls are recorded
+# as well as the requests.
+async def run_standalone(plan, recorder=None):
+    shared_buffer = None
+    if plan['shared_buffer']:
+        with open(plan['file_path'], 'rb') as f:
+            shared_buffer = f.read()
+    connector = aiohttp.TCPConnector(limit=0)
+    monitor = asyncio.create_task(tracing.monitor_event_loop(recorder)) if recorder is not None else None
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=0), connector=connector) as session:
+            return await run_plan(session, plan, shared_buffer, recorder)
+    finally:
+        if monitor is not None:
+            monitor.cancel()
+
+
+# Returns the stats of the plan, and the trace events it recorded if the plan has 'trace' set.
+def run_process(plan):
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+    recorder = tracing.SpanRecorder(plan['label']) if plan.get('trace') else None
+    stats = asyncio.run(run_standalone(plan, recorder))
+    return stats.to_dict(), recorder.events if recorder is not None else None
+
+
+# Runs a plan split across separate processes, each with its own event loop and connection
+# pool, so that the client isn't limited to one CPU. The processes are started together
+# at the plan's start_at time, or after startup_delay seconds if it has none, and their
+# stats are merged into one. The trace events of each process are merged into recorder.
+def run_processes(plan, processes, startup_delay=2.0, recorder=None):
+    start_at = plan.get('start_at') or time.time() + startup_delay
+    plans = split_plan(dict(plan, start_at=start_at, trace=recorder is not None), processes)
+    logging.info(f'Starting {len(plans)} processes...')
+    with multiprocessing.get_context('spawn').Pool(len(plans)) as pool:
+        results = pool.map(run_process, plans)
+    stats = async_utils.RunStats()
+    for result, events in results:
+        stats.merge(async_utils.RunStats.from_dict(result))
+        if recorder is not None:
+            recorder.merge(events)
+    return stats
@@ -6,12 +6,122 @@ import json
 import logging
 import async_utils
 import datetime
+import driver
+import tracing
 
 from setup import setup, teardown, file_mask_context_name, file_search_context_name
+from stats import find_knee, usl_fit
+
+
+def make_plan(arguments, context, **plan):
+    return {
+        'mode': 'pool',
+        'context': context,
+        'file_path': file_path,
+        'file_name': file_name,
+        'label': str(arguments.lines),
+        'workers': arguments.workers,
+        'number_files': arguments.number_files,
+        'rate': None,
+        'duration': arguments.duration,
+        'arrival': arguments.arrival,
+        'seed': arguments.seed,
+        'chunk_size': arguments.chunk_size,
+        'shared_buffer': arguments.shared_buffer,
+        'sink': arguments.sink,
+        **plan
+    }
+
+
+# Runs a plan in this event loop, or split across --processes separate processes.
+async def run(session, arguments, plan, shared_buffer, recorder=None):
+    if arguments.processes > 1:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, driver.run_processes, plan, arguments.processes, 2.0, recorder)
+    return await driver.run_plan(session, plan, shared_buffer, recorder)
+
+
+def sweep_levels(maximum, scale):
+    if scale == 'linear':
+        return list(range(1, maximum + 1))
+    levels = []
+    workers = 1
+    while workers < maximum:
+        levels.append(workers)
+        workers *= 2
+    return levels + [maximum]
+
+
+# Runs the benchmark once per concurrency level with the same server contexts, and reports
+# where throughput levels off or latency starts rising faster than throughput.
+async def sweep(session, context, arguments, shared_buffer, recorder=None):
+    levels = sweep_levels(arguments.sweep, arguments.sweep_scale)
+    results = []
+    for workers in levels:
+        logging.info(f'Running with {workers} workers...')
+        stats = await async_utils.run_pool(session, context, file_path, file_name, arguments.lines,
+                                           workers, max(arguments.number_files, workers), arguments.chunk_size,
+                                           shared_buffer, async_utils.sinks[arguments.sink], recorder)
+        summary = stats.summary()
+        # By Little's law, throughput x mean service time is the number of requests actually in
+        # flight, which falls short of the worker count when the client can't keep them busy.
+        summary['inFlight'] = summary['filesPerSecond'] * summary['service']['mean']
+        results.append({'workers': workers, **summary})
+        logging.info(f'{workers} workers: {summary["filesPerSecond"]:.3f} files/s, '
+                     f'{summary["megabytesPerSecond"]:.3f} MB/s, p99 {summary["service"]["p99"]:.4f} seconds, '
+                     f'{summary["inFlight"]:.2f} in flight')
+
+    throughputs = [result['filesPerSecond'] for result in results]
+    latencies = [result['service']['p99'] for result in results]
+    knee = find_knee(levels, throughputs, latencies)
+    single, sigma, kappa, peak = usl_fit(levels, throughputs)
+    logging.info(f'Knee: {knee} workers ({throughputs[levels.index(knee)]:.3f} files/s).')
+    logging.info(f'USL fit: lambda {single:.3f} files/s, sigma {sigma:.4f}, kappa {kappa:.6f}, '
+                 f'peak at {f"{peak:.1f}" if peak else "more than the levels tried"} workers.')
+    async_utils.write_report(f'results/{arguments.lines}', {
+        'lines': arguments.lines,
+        'levels': results,
+        'knee': knee,
+        'usl': {'lambda': single, 'sigma': sigma, 'kappa': kappa, 'peak': peak}
+    }, name='sweep')
+
+
+# Runs the benchmark open-loop at each target arrival rate, and reports latency against
+# offered load. Stops after the first rate the server can't keep up with, judged by the rate
+# responses came back at rather than files / elapsed, which counts the latency of the last
+# responses against the rate however far the server is from saturation.
+async def open_loop(session, context, arguments, shared_buffer, recorder=None):
+    results = []
+    for rate in arguments.rate:
+        logging.info(f'Running at {rate} requests/s for {arguments.duration} seconds...')
+        stats = await run(session, arguments, make_plan(arguments, context, mode='open_loop', rate=rate),
+                          shared_buffer, recorder)
+        summary = stats.summary()
+        achieved = summary['completionsPerSecond'] or 0.0
+        summary['saturated'] = achieved < 0.9 * rate
+        results.append({'rate': rate, **summary})
+        logging.info(f'{rate} requests/s offered: {achieved:.3f} files/s achieved, '
+                     f'p50 {summary["endToEnd"]["p50"]:.4f}, p99 {summary["endToEnd"]["p99"]:.4f}, '
+                     f'p99.9 {summary["endToEnd"]["p99.9"]:.4f} seconds')
+        if summary['saturated']:
+            logging.info(f'Saturated at {rate} requests/s.')
+            break
+    async_utils.write_report(f'results/{arguments.lines}', {
+        'lines': arguments.lines,
+        'arrival': arguments.arrival,
+        'duration': arguments.duration,
+        'processes': arguments.processes,
+        'rates': results
+    }, name='open_loop')
 
 
 async def main(arguments):
-    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=0)) as session:
+    # The connection pool is unlimited so that the number of concurrent requests is set
+    # by the workers or the arrival rate alone.
+    connector = aiohttp.TCPConnector(limit=0)
+    recorder = tracing.SpanRecorder('text-async') if arguments.trace else None
+    monitor = asyncio.create_task(tracing.monitor_event_loop(recorder)) if recorder is not None else None
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=0), connector=connector) as session:
         try:
             await setup(session, arguments.buffer_limit)
             context = json.dumps({
@@ -20,26 +130,32 @@ async def main(arguments):
             })
             start_time = datetime.datetime.now()
             logging.info(f'Start time: {start_time}')
-            queue = asyncio.Queue(arguments.workers)
-            workers = [asyncio.create_task(async_utils.benchmark_search_mask_async(session, file_name, context,
-                                                                                   arguments.lines, q, queue)) for q in
-                       range(arguments.number_files)]
-            file_datas = [file_data for _ in range(arguments.number_files)]
-            for obj in file_datas:
-                await queue.put(obj)
-            # wait for either `queue.join()` to complete or a consumer to raise
-            done, _ = await asyncio.wait([queue.join(), *workers],
-                                         return_when=asyncio.FIRST_COMPLETED)
-            error_raised = set(done) & set(workers)
-            if error_raised:
-                await error_raised.pop()  # propagate the exception
-            logging.info('Stopping workers...')
-            for worker in workers:
-                worker.cancel()
+            shared_buffer = None
+            if arguments.shared_buffer:
+                with open(file_path, 'rb') as f:
+                    shared_buffer = f.read()
+            if arguments.rate:
+                await open_loop(session, context, arguments, shared_buffer, recorder)
+            elif arguments.sweep:
+                await sweep(session, context, arguments, shared_buffer, recorder)
+            else:
+                stats = await run(session, arguments, make_plan(arguments, context), shared_buffer, recorder)
+                summary = stats.summary()
+                async_utils.log_summary(summary)
+                async_utils.write_report(f'results/{arguments.lines}', {
+                    'lines': arguments.lines,
+                    'workers': arguments.workers,
+                    'processes': arguments.processes,
+                    **summary,
+                    'histograms': stats.to_dict()
+                })
         finally:
             end_time = datetime.datetime.now()
             logging.info(f'End time: {end_time}')
             logging.info(f'Total elapsed time: {end_time - start_time}')
+            if recorder is not None:
+                monitor.cancel()
+                recorder.write(f'results/{arguments.lines}/trace.json')
             await teardown(session)
 
 
@@ -53,24 +169,44 @@ if __name__ == "__main__":
     parser.add_argument('-b', '--buffer-limit', metavar='N', type=int,
                         help='Set the buffer limit to use for the text file in memory-constrained environments.')
     parser.add_argument('-w', '--workers', metavar='N', type=int, default=4,
-                        help=('The max number of workers to use to process the files. '
-                              'The default number is 4.'))
+                        help=('The number of workers to use to process the files, i.e. the number of '
+                              'concurrent requests. The default number is 4.'))
+    parser.add_argument('-c', '--chunk-size', metavar='N', type=int, default=65536,
+                        help='The chunk size used to stream the test file to the API. The default is 65536.')
+    parser.add_argument('--shared-buffer', action='store_true',
+                        help=('Read the test file into a single bytes buffer once and send it with every request, '
+                              'instead of streaming it from disk.'))
+    parser.add_argument('-s', '--sink', choices=sorted(async_utils.sinks), default='file',
+                        help=('Where to stream the masked files and results: "file" writes them to disk, '
+                              '"null" discards them. The default is file.'))
+    parser.add_argument('--sweep', metavar='MAX', type=int,
+                        help=('Run once for each number of workers up to MAX instead of using --workers, and report '
+                              'where throughput levels off. Each run processes max(N, workers) files.'))
+    parser.add_argument('--sweep-scale', choices=['geometric', 'linear'], default='geometric',
+                        help='Use worker counts 1, 2, 4, ..., MAX (geometric) or 1, 2, 3, ..., MAX (linear). '
+                             'The default is geometric.')
+    parser.add_argument('-r', '--rate', metavar='LIST', type=lambda value: [float(rate) for rate in value.split(',')],
+                        help=('Run open-loop instead of using workers: send requests at a target rate in requests/s '
+                              'without waiting for responses. A comma separated list of rates, e.g. 5,10,20, '
+                              'runs each rate in turn until the server saturates.'))
+    parser.add_argument('-d', '--duration', metavar='S', type=float, default=10,
+                        help='How long to send requests at each rate in seconds. The default is 10.')
+    parser.add_argument('--arrival', choices=['fixed', 'poisson'], default='fixed',
+                        help=('Send requests at fixed intervals or with exponentially distributed intervals '
+                              '(a Poisson process). The default is fixed.'))
+    parser.add_argument('--seed', type=int, help='Seed for the Poisson arrival schedule.')
+    parser.add_argument('-p', '--processes', metavar='N', type=int, default=1,
+                        help=('The number of client processes, each with its own event loop and connections. The '
+                              'workers, files and arrival rate are divided between them. The default is 1.'))
+    parser.add_argument('--trace', action='store_true',
+                        help=('Record the idle time, upload, server time and response of every request on a track '
+                              'per worker, and write them to results/{lines}/trace.json in the Chrome trace event '
+                              'format.'))
     args = parser.parse_args()
+    if args.sweep and args.processes > 1:
+        parser.error('--sweep can only be used with a single process.')
     lines = args.lines
     buffer_limit = args.buffer_limit
-    test_folder = 'test-files'
-    file_name = f'test-{lines}.txt'
-    file_path = f'{test_folder}/{file_name}'
-    os.makedirs(test_folder, exist_ok=True)
+    file_path, file_name = async_utils.create_test_file(lines)
     os.makedirs(f'results/{lines}', exist_ok=True)
-    if not os.path.exists(file_path):
-        logging.info(f'Creating {file_name}...')
-        test_line = 'this is a test'
-        line = '#' * (1000 - len(test_line) - len(os.linesep)) + test_line + os.linesep
-        with open(file_path, 'w') as f:
-            for i in range(lines):
-                f.write(line)
-        logging.info(f'Created {file_name}.')
-    f_2 = open(file_path, 'r')
-    file_data = f_2.read()
     asyncio.run(main(args))
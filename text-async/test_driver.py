@@ -0,0 +1,31 @@
+import itertools
+import unittest
+
+import driver
+
+
+def pool_plan(workers, number_files):
+    return {'mode': 'pool', 'label': '100', 'workers': workers, 'number_files': number_files}
+
+
+class SplitPlanTest(unittest.TestCase):
+
+    def test_files_add_up(self):
+        for workers, number_files, parts in itertools.product(range(1, 9), range(0, 21), range(1, 6)):
+            plan = pool_plan(workers, number_files)
+            plans = driver.split_plan(plan, parts)
+            self.assertEqual(sum(p['number_files'] for p in plans), plan['number_files'])
+            self.assertTrue(all(p['workers'] > 0 and p['number_files'] > 0 for p in plans))
+
+    def test_more_parts_than_workers(self):
+        plans = driver.split_plan(pool_plan(2, 10), 4)
+        self.assertEqual([(p['workers'], p['number_files']) for p in plans], [(1, 5), (1, 5)])
+
+    def test_split_twice(self):
+        plans = driver.split_plan(pool_plan(3, 9), 2, name='agent')
+        files = sum(p['number_files'] for agent_plan in plans for p in driver.split_plan(agent_plan, 2))
+        self.assertEqual(files, 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
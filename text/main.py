@@ -12,6 +12,7 @@ sys.path.append(parent_dir)
 
 from setup import setup, teardown, file_mask_context_name, file_search_context_name
 
+import generator
 import utils
 
 if __name__ == '__main__':
@@ -20,31 +21,24 @@ if __name__ == '__main__':
   parser.add_argument('lines', type=int, help='The number of text lines to create for the test file. Each line is 1kb in size.')
   parser.add_argument('-i', '--iterations', metavar='N', type=int, default=10, help='The number of times the test should be run to obtain the average. Defaults to 10.')
   parser.add_argument('-b', '--buffer-limit', metavar='N', type=int, help='Set the buffer limit to use for the text file in memory-constrained environments.')
+  parser.add_argument('--generate-processes', metavar='N', type=int, default=1, help='The number of processes used to create the test file. Defaults to 1.')
+  utils.add_benchmark_arguments(parser)
 
   args = parser.parse_args()
   lines = args.lines
   iterations = args.iterations
   buffer_limit = args.buffer_limit
-  test_folder = 'test-files'
-  file_name = f'test-{lines}.txt'
-  file_path = f'{test_folder}/{file_name}'
-  os.makedirs(test_folder, exist_ok=True)
-  if not os.path.exists(file_path):
-    logging.info(f'Creating {file_name}...')
-    test_line = 'this is a test'
-    line = '#' * (1000 - len(test_line) - len(os.linesep)) + test_line + os.linesep
-    with open(file_path, 'w') as f:
-      for i in range(lines):
-        f.write(line)
-    logging.info(f'Created {file_name}.')
+  file_path = generator.test_file('txt', lines, args.generate_processes)
   with requests.Session() as session:
+    cache = utils.context_cache(session, args)
     try:
-      setup(session, buffer_limit)
+      setup(session, buffer_limit, cache)
       context = json.dumps({
           "fileSearchContextName": file_search_context_name,
           "fileMaskContextName": file_mask_context_name
       })
       utils.benchmark_search_mask(session, file_path, context, 
-                                  lines, 'text/plain', iterations)
+                                  lines, 'text/plain', iterations, records=lines,
+                                  **utils.benchmark_options(args))
     finally:
-      teardown(session)
+      teardown(session, cache)
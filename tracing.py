@@ -0,0 +1,119 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+
+
+# Records spans of time on named tracks (one per worker) and writes them out in the Chrome
+# trace event format, which chrome://tracing and https://ui.perfetto.dev can open. Each track
+# is shown as a thread of the recording process, with spans nested by time, so that queue
+# waits, idle workers and slow phases of a request can be seen next to each other. Times
+# are taken with time.perf_counter() and written as wall clock microseconds, so the events
+# of several processes recorded on the same host line up when they are merged.
+class SpanRecorder():
+
+  def __init__(self, name=None):
+    self.pid = os.getpid()
+    self.origin = time.time() - time.perf_counter()
+    self.tracks = {}
+    self.events = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'tid': 0,
+                    'args': {'name': name or f'process-{self.pid}'}}]
+
+  def _timestamp(self, t):
+    return round((self.origin + t) * 1000000, 1)
+
+  def track(self, name):
+    if name not in self.tracks:
+      tid = len(self.tracks) + 1
+      self.tracks[name] = tid
+      self.events.append({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}})
+      self.events.append({'name': 'thread_sort_index', 'ph': 'M', 'pid': self.pid, 'tid': tid,
+                          'args': {'sort_index': tid}})
+    return self.tracks[name]
+
+  # Adds a span from start to end, both time.perf_counter() values.
+  def add(self, track, name, start, end, **args):
+    self.events.append({'name': name, 'ph': 'X', 'pid': self.pid, 'tid': self.track(track),
+                        'ts': self._timestamp(start), 'dur': round(max(end - start, 0) * 1000000, 1),
+                        'args': args})
+
+  @contextlib.contextmanager
+  def span(self, track, name, **args):
+    start = time.perf_counter()
+    try:
+      yield args
+    finally:
+      self.add(track, name, start, time.perf_counter(), **args)
+
+  def merge(self, events):
+    self.events.extend(events)
+    return self
+
+  def write(self, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+      json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+    logging.info(f'Written out {path} ({len(self.events)} events), open it in https://ui.perfetto.dev.')
+
+
+# Returns recorder.span(...), or a context that records nothing if recorder is None, so that
+# callers don't need to check whether tracing is on.
+def span(recorder, track, name, **args):
+  if recorder is None:
+    return contextlib.nullcontext(args)
+  return recorder.span(track, name, **args)
+
+
+# Times the phases of one streamed HTTP request on a track:
+#   upload - until the request body has been consumed by the client
+#   server - from then until the response headers arrive
+#   response - from then until the response has been read
+# inside a 'request' span covering all three. The body must be passed through body() for
+# the upload to be timed. If the server responds before the body has been consumed, or the
+# body isn't a stream, upload and server are recorded as a single 'upload + server' span.
+class RequestSpans():
+
+  def __init__(self, recorder, track, name='request', **args):
+    self.recorder = recorder
+    self.track = track
+    self.name = name
+    self.args = args
+    self.start = time.perf_counter()
+    self.uploaded = None
+    self.responded = None
+
+  async def body(self, chunks):
+    async for chunk in chunks:
+      yield chunk
+    self.uploaded = time.perf_counter()
+
+  def response_started(self):
+    self.responded = time.perf_counter()
+
+  def end(self, **args):
+    if self.recorder is None:
+      return
+    end = time.perf_counter()
+    responded = self.responded or end
+    self.recorder.add(self.track, self.name, self.start, end, **self.args, **args)
+    if self.uploaded is not None and self.uploaded <= responded:
+      self.recorder.add(self.track, 'upload', self.start, self.uploaded)
+      self.recorder.add(self.track, 'server', self.uploaded, responded)
+    else:
+      self.recorder.add(self.track, 'upload + server', self.start, responded)
+    if self.responded is not None:
+      self.recorder.add(self.track, 'response', self.responded, end)
+
+
+# Sleeps 'interval' seconds at a time until cancelled, and records a span on the 'event loop'
+# track whenever a sleep overran by more than 'threshold' seconds, i.e. when a callback held
+# the event loop and delayed every other task.
+async def monitor_event_loop(recorder, interval=0.01, threshold=0.005):
+  while True:
+    start = time.perf_counter()
+    await asyncio.sleep(interval)
+    lag = time.perf_counter() - start - interval
+    if lag > threshold:
+      recorder.add('event loop', 'stall', start + interval, start + interval + lag, lag=lag)
@@ -0,0 +1,61 @@
+import json
+import os
+import threading
+import time
+
+trace_file = 'results/traffic.jsonl'
+
+
+# Appends one JSON line of metadata per mask request to a trace file, which replay/main.py
+# can re-issue against a server. Each line has:
+#   timestamp - wall clock time (time.time()) the request was sent
+#   format - the file extension, mediaType - the media type sent
+#   bytes - the size of the file, compression - the Content-Encoding used if any
+#   context - the fileSearchContextName and fileMaskContextName sent
+#   latency - seconds until the response was fully read, status - 'ok' or 'error'
+# Lines are appended with a separate open so that several threads or processes can record
+# to the same file.
+class TraceRecorder():
+
+  def __init__(self, path=trace_file):
+    self.path = path
+    self.lock = threading.Lock()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+  def record(self, timestamp, file_path, media_type, context, latency, status='ok', compression=None):
+    entry = {
+      'timestamp': timestamp,
+      'format': os.path.splitext(file_path)[1].lstrip('.').lower(),
+      'mediaType': media_type,
+      'bytes': os.path.getsize(file_path),
+      'compression': compression,
+      'context': json.loads(context),
+      'latency': latency,
+      'status': status
+    }
+    line = json.dumps(entry) + '\n'
+    with self.lock:
+      with open(self.path, 'a') as f:
+        f.write(line)
+
+  # Returns a function that calls send() and records the request, for file_path sent with
+  # media_type and context.
+  def wrap(self, send, file_path, media_type, context, compression=None):
+    def recorded():
+      timestamp = time.time()
+      start = time.perf_counter()
+      try:
+        result = send()
+      except Exception:
+        self.record(timestamp, file_path, media_type, context, time.perf_counter() - start, 'error', compression)
+        raise
+      self.record(timestamp, file_path, media_type, context, time.perf_counter() - start, 'ok', compression)
+      return result
+    return recorded
+
+
+# Reads a trace file, ordered by timestamp.
+def read_trace(path=trace_file):
+  with open(path) as f:
+    entries = [json.loads(line) for line in f if line.strip()]
+  return sorted(entries, key=lambda entry: entry['timestamp'])
@@ -1,16 +1,32 @@
+import csv
+import gc
+import hashlib
+import json
 import logging
+import multiprocessing
 import numpy as np
 import os
 import pathlib
-import timeit
+import platform
+import socket
+import time
+import zlib
 
 from requests_toolbelt import MultipartEncoder
 from streaming_form_data import StreamingFormDataParser
 from streaming_form_data.targets import FileTarget
 
+try:
+  import zstandard
+except ImportError:
+  zstandard = None
+
 from server_config import hostname, port, is_https
+from stats import Histogram, write_percentiles
+from traffic import TraceRecorder, trace_file
 
 host = f'http{"s" if is_https else ""}://{hostname}:{port}/api/darkshield'
+contexts_file = 'results/contexts.json'
 
 def create_context(session, context, data):
   url = f'{host}/{context}.create'
@@ -26,44 +42,440 @@ def destroy_context(session, context, name):
   session.post(url, json={'name': name})
 
 
-def benchmark_search_mask(session, file_path, context, file_size, media_type, iterations, chunk_size=4096):
-  folder_name = f'results/{file_size}'
-  def send():  
-    url = f'{host}/files/fileSearchContext.mask'
-    headers = {'Accept-Encoding': "gzip", 'Transfer-Encoding': "gzip"}
-    extension = os.path.splitext(file_path)[1]
-    os.makedirs(folder_name, exist_ok=True)
-    with open(file_path, 'rb') as f:
-      if len(media_type) > 0:
-          encoder = MultipartEncoder(fields={
-            'context': ('context', context, 'application/json'),
-            'file': ('file', f, media_type)
-          })
-      else:
-          encoder = MultipartEncoder(fields={
-            'context': ('context', context, 'application/json'),
-            'file': ('file', f)
-          })
-      with session.post(url, data=encoder, stream=True,
-                        headers={'Content-Type': encoder.content_type}) as r:
-        if r.status_code >= 300:
-          raise Exception(f"Failed with status {r.status_code}:\n\n{r.json()}")
-
-        parser = StreamingFormDataParser(headers=r.headers)
-        parser.register('file', FileTarget(f'{folder_name}/masked{extension}'))
-        parser.register('results', FileTarget(f'{folder_name}/results.json'))
-        for chunk in r.iter_content(chunk_size):
-          parser.data_received(chunk)
-
-  times = timeit.repeat(send, number=1, repeat=iterations)
+def context_hash(context, data):
+  return hashlib.sha256(json.dumps([context, data], sort_keys=True).encode()).hexdigest()
+
+
+# Creates contexts idempotently. Each context is keyed by a hash of its type and definition,
+# so creating the same definition again is a no-op, while a changed definition replaces the
+# context of the same name. With a path, the contexts created are saved there so that later
+# runs against the same server can reuse them, and with keep set they are not destroyed on
+# teardown.
+class ContextCache():
+
+  def __init__(self, session, path=None, keep=False):
+    self.session = session
+    self.path = path
+    self.keep = keep
+    self.contexts = {}
+    if path and os.path.exists(path):
+      with open(path) as f:
+        self.contexts = json.load(f)
+
+  def save(self):
+    if self.path:
+      os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+      with open(self.path, 'w') as f:
+        json.dump(self.contexts, f, indent=2)
+
+  def create(self, context, data):
+    key = f'{context}:{data["name"]}'
+    digest = context_hash(context, data)
+    if self.contexts.get(key) == digest:
+      logging.info(f'Reusing {context} "{data["name"]}".')
+      return False
+    if key in self.contexts:
+      destroy_context(self.session, context, data['name'])
+    create_context(self.session, context, data)
+    self.contexts[key] = digest
+    self.save()
+    return True
+
+  def destroy(self, context, name):
+    destroy_context(self.session, context, name)
+    self.forget(context, name)
+
+  def forget(self, context, name):
+    if self.contexts.pop(f'{context}:{name}', None) is not None:
+      self.save()
+
+
+def create_contexts(session, contexts, cache=None):
+  for context, data in contexts:
+    if cache is None:
+      create_context(session, context, data)
+    else:
+      cache.create(context, data)
+
+
+# Without a cache, the destroyed contexts are still removed from contexts_file, so that a
+# later --keep-contexts run doesn't reuse contexts that no longer exist on the server.
+def destroy_contexts(session, contexts, cache=None):
+  if cache is not None and cache.keep:
+    logging.info('Keeping contexts.')
+    return
+  saved = ContextCache(session, contexts_file) if cache is None else cache
+  for context, data in contexts:
+    saved.destroy(context, data['name'])
+
+
+phase_names = ['open', 'encode', 'upload', 'first_byte', 'parse', 'write']
+
+
+# Wraps a MultipartEncoder to record when requests has finished reading the upload body.
+class TimedReader():
+
+  def __init__(self, encoder):
+    self.encoder = encoder
+    self.len = encoder.len
+    self.finished = None
+
+  def read(self, size=-1):
+    chunk = self.encoder.read(size)
+    if not chunk and self.finished is None:
+      self.finished = time.perf_counter()
+    return chunk
+
+
+# A FileTarget that accumulates the time spent on disk I/O.
+class TimedFileTarget(FileTarget):
+
+  def __init__(self, filename):
+    super().__init__(filename)
+    self.elapsed = 0.0
+
+  def _timed(self, method, *args):
+    start = time.perf_counter()
+    method(*args)
+    self.elapsed += time.perf_counter() - start
+
+  def on_start(self):
+    self._timed(super().on_start)
+
+  def on_data_received(self, chunk):
+    self._timed(super().on_data_received, chunk)
+
+  def on_finish(self):
+    self._timed(super().on_finish)
+
+
+compressions = ['gzip', 'zstd']
+
+
+def compressor(compression):
+  if compression == 'gzip':
+    return zlib.compressobj(6, zlib.DEFLATED, 31)
+  if compression == 'zstd':
+    if zstandard is None:
+      raise Exception('zstd compression requires the zstandard package.')
+    return zstandard.ZstdCompressor().compressobj()
+  raise ValueError(f'Unsupported compression: {compression}')
+
+
+# Returns a streaming decompressor for a response Content-Encoding, or None if the response
+# is not compressed.
+def decompressor(encoding):
+  if not encoding or encoding == 'identity':
+    return None
+  if encoding == 'gzip':
+    return zlib.decompressobj(47)
+  if encoding == 'deflate':
+    return zlib.decompressobj()
+  if encoding == 'zstd' and zstandard is not None:
+    return zstandard.ZstdDecompressor().decompressobj()
+  raise Exception(f'Unsupported response encoding: {encoding}')
+
+
+# Compresses the request body as it is read by requests, which sends it chunked.
+def compressed_body(reader, compression, chunk_size, transfer):
+  compress = compressor(compression)
+  chunk = reader.read(chunk_size)
+  while chunk:
+    data = compress.compress(chunk)
+    if data:
+      transfer['bytesSent'] += len(data)
+      yield data
+    chunk = reader.read(chunk_size)
+  data = compress.flush()
+  transfer['bytesSent'] += len(data)
+  yield data
+
+
+# Sends a single search/mask request and writes the response to folder_name.
+# Returns the time in seconds spent in each of the phase_names:
+#   open - opening the input file
+#   encode - building the multipart request body
+#   upload - sending the request body
+#   first_byte - waiting for the response headers after the upload has completed
+#   parse - streaming the response through the multipart parser, excluding disk writes
+#   write - writing the masked file and results.json to disk
+# and the bytes sent and received on the wire and the CPU time used by the client.
+# With compression set to one of compressions, the request body is compressed as it is
+# sent and the response is requested with the same encoding. Otherwise both are uncompressed.
+def mask_file(session, file_path, context, media_type, folder_name, chunk_size=4096, compression=None):
+  url = f'{host}/files/fileSearchContext.mask'
+  extension = os.path.splitext(file_path)[1]
+  os.makedirs(folder_name, exist_ok=True)
+  phases = {}
+  transfer = {'bytesSent': 0, 'bytesReceived': 0}
+  start = time.perf_counter()
+  cpu_start = time.process_time()
+  with open(file_path, 'rb') as f:
+    opened = time.perf_counter()
+    phases['open'] = opened - start
+    if len(media_type) > 0:
+        encoder = MultipartEncoder(fields={
+          'context': ('context', context, 'application/json'),
+          'file': ('file', f, media_type)
+        })
+    else:
+        encoder = MultipartEncoder(fields={
+          'context': ('context', context, 'application/json'),
+          'file': ('file', f)
+        })
+    reader = TimedReader(encoder)
+    headers = {'Content-Type': encoder.content_type}
+    if compression:
+      headers['Content-Encoding'] = compression
+      headers['Accept-Encoding'] = compression
+      data = compressed_body(reader, compression, chunk_size, transfer)
+    else:
+      headers['Accept-Encoding'] = 'identity'
+      transfer['bytesSent'] = encoder.len
+      data = reader
+    encoded = time.perf_counter()
+    phases['encode'] = encoded - opened
+    with session.post(url, data=data, stream=True, headers=headers) as r:
+      responded = time.perf_counter()
+      uploaded = reader.finished or responded
+      phases['upload'] = uploaded - encoded
+      phases['first_byte'] = responded - uploaded
+      if r.status_code >= 300:
+        raise Exception(f"Failed with status {r.status_code}:\n\n{r.json()}")
+
+      file_target = TimedFileTarget(f'{folder_name}/masked{extension}')
+      results_target = TimedFileTarget(f'{folder_name}/results.json')
+      parser = StreamingFormDataParser(headers=r.headers)
+      parser.register('file', file_target)
+      parser.register('results', results_target)
+      # The response is read undecoded so that the bytes on the wire can be counted.
+      decompress = decompressor(r.headers.get('Content-Encoding'))
+      for chunk in r.raw.stream(chunk_size, decode_content=False):
+        transfer['bytesReceived'] += len(chunk)
+        if decompress:
+          chunk = decompress.decompress(chunk)
+        parser.data_received(chunk)
+      if decompress and hasattr(decompress, 'flush'):
+        parser.data_received(decompress.flush())
+      phases['write'] = file_target.elapsed + results_target.elapsed
+      phases['parse'] = time.perf_counter() - responded - phases['write']
+  transfer['cpuTime'] = time.process_time() - cpu_start
+  return phases, transfer
+
+
+def coefficient_of_variation(times):
+  mean = np.mean(times)
+  return np.std(times) / mean if mean else 0.0
+
+
+# Runs send() until enough timed samples have been collected and returns a list of
+# (elapsed, result) tuples. The first 'warmup' calls are never timed. With steady_state set,
+# send() is repeated until the coefficient of variation of the last 'iterations' samples
+# drops to steady_state or lower (or max_iterations is reached), and only those samples are
+# returned. Garbage collection can be suspended during the timed calls, and the client
+# pinned to a set of CPUs for the whole run.
+def run_iterations(send, iterations, warmup=0, steady_state=None, max_iterations=None,
+                   disable_gc=False, cpus=None):
+  previous_cpus = None
+  if cpus:
+    if hasattr(os, 'sched_setaffinity'):
+      previous_cpus = os.sched_getaffinity(0)
+      os.sched_setaffinity(0, cpus)
+      logging.info(f'Pinned client to CPUs {sorted(cpus)}.')
+    else:
+      logging.warning('CPU affinity is not supported on this platform, ignoring.')
+  gc_enabled = gc.isenabled()
+  try:
+    for i in range(warmup):
+      send()
+    if warmup:
+      logging.info(f'Completed {warmup} warmup iterations.')
+    max_iterations = max_iterations or iterations * 10
+    samples = []
+    while True:
+      if disable_gc:
+        gc.collect()
+        gc.disable()
+      start = time.perf_counter()
+      result = send()
+      elapsed = time.perf_counter() - start
+      if disable_gc and gc_enabled:
+        gc.enable()
+      samples.append((elapsed, result))
+      if len(samples) < iterations:
+        continue
+      if steady_state is None:
+        break
+      cv = coefficient_of_variation([elapsed for elapsed, _ in samples[-iterations:]])
+      if cv <= steady_state:
+        logging.info(f'Reached steady state (CV {cv:.4f}) after {len(samples)} iterations.')
+        break
+      if len(samples) >= max_iterations:
+        logging.warning(f'No steady state (CV {cv:.4f}) after {len(samples)} iterations.')
+        break
+    return samples[-iterations:]
+  finally:
+    if gc_enabled:
+      gc.enable()
+    if previous_cpus is not None:
+      os.sched_setaffinity(0, previous_cpus)
+
+
+def add_benchmark_arguments(parser):
+  parser.add_argument('--warmup', metavar='N', type=int, default=0,
+                      help='The number of untimed iterations to run first. Defaults to 0.')
+  parser.add_argument('--steady-state', metavar='CV', type=float,
+                      help=('Keep running until the coefficient of variation of the last N iterations '
+                            'is at most CV, e.g. 0.05.'))
+  parser.add_argument('--max-iterations', metavar='N', type=int,
+                      help='The max number of timed iterations when using --steady-state. Defaults to 10x iterations.')
+  parser.add_argument('--no-gc', dest='disable_gc', action='store_true',
+                      help='Suspend garbage collection during timed iterations.')
+  parser.add_argument('--cpus', metavar='LIST', type=lambda value: {int(cpu) for cpu in value.split(',')},
+                      help='Comma separated list of CPUs to pin the client to, e.g. 0,1.')
+  parser.add_argument('--compression', choices=compressions,
+                      help=('Compress the request body and request a compressed response. Results are written '
+                            'to results/{size}-{compression}. zstd requires the zstandard package.'))
+  parser.add_argument('--keep-contexts', action='store_true',
+                      help=(f'Keep the server contexts after the run and reuse them in later runs while their '
+                            f'definitions are unchanged. The contexts created are tracked in {contexts_file}.'))
+  parser.add_argument('--record', metavar='FILE', nargs='?', const=trace_file,
+                      help=f'Append the metadata of every request to a JSON Lines trace for replay/main.py. Defaults to {trace_file}.')
+
+
+def context_cache(session, args):
+  if args.keep_contexts:
+    return ContextCache(session, contexts_file, keep=True)
+  return None
+
+
+def benchmark_options(args):
+  return {
+    'compression': args.compression,
+    'warmup': args.warmup,
+    'steady_state': args.steady_state,
+    'max_iterations': args.max_iterations,
+    'disable_gc': args.disable_gc,
+    'cpus': args.cpus,
+    'recorder': TraceRecorder(args.record) if args.record else None
+  }
+
+
+def benchmark_search_mask(session, file_path, context, file_size, media_type, iterations, chunk_size=4096,
+                          records=None, compression=None, recorder=None, **timing):
+  folder_name = f'results/{file_size}{f"-{compression}" if compression else ""}'
+  extension = os.path.splitext(file_path)[1]
+  def send():
+    return mask_file(session, file_path, context, media_type, folder_name, chunk_size, compression)
+  if recorder is not None:
+    send = recorder.wrap(send, file_path, media_type, context, compression)
+
+  samples = run_iterations(send, iterations, **timing)
+  times = [elapsed for elapsed, _ in samples]
+  phases = {name: Histogram() for name in phase_names}
+  cpu = Histogram()
+  transfer = {'bytesSent': 0, 'bytesReceived': 0}
+  for _, (result, request_transfer) in samples:
+    for name, elapsed in result.items():
+      phases[name].record(elapsed)
+    cpu.record(request_transfer['cpuTime'])
+    transfer['bytesSent'] += request_transfer['bytesSent'] / iterations
+    transfer['bytesReceived'] += request_transfer['bytesReceived'] / iterations
+  latency = Histogram()
+  for t in times:
+    latency.record(t)
+  total_time = np.sum(times)
+  file_bytes = os.path.getsize(file_path)
+  throughput = {
+    'bytesPerSecond': file_bytes * iterations / total_time,
+    'megabytesPerSecond': file_bytes * iterations / total_time / 1e6,
+    'recordsPerSecond': records * iterations / total_time if records else None
+  }
   results_file = f'{folder_name}/benchmarks.txt'
   with open(results_file, 'w') as f:
     f.write(f'Iterations: {iterations}{os.linesep}')
+    f.write(f'Coefficient of variation: {coefficient_of_variation(times)}{os.linesep}')
     f.write(f'Lowest: {np.min(times)} seconds{os.linesep}')
     f.write(f'Highest: {np.max(times)} seconds{os.linesep}')
     f.write(f'Mean: {np.mean(times)} seconds{os.linesep}')
     f.write(f'Median: {np.median(times)} seconds{os.linesep}')
     f.write(f'Stdev: {np.std(times)} seconds{os.linesep}')
     f.write(f'Variance: {np.var(times)} seconds{os.linesep}')
-    f.write(f'Total time: {np.sum(times)} seconds{os.linesep}')
+    write_percentiles(f, latency, os.linesep)
+    f.write(f'Phases:{os.linesep}')
+    for name, histogram in phases.items():
+      f.write(f'  {name}: mean {histogram.mean()} seconds{os.linesep}')
+      write_percentiles(f, histogram, os.linesep, indent='    ')
+    f.write(f'Compression: {compression or "none"}{os.linesep}')
+    f.write(f'Bytes sent per request: {transfer["bytesSent"]}{os.linesep}')
+    f.write(f'Bytes received per request: {transfer["bytesReceived"]}{os.linesep}')
+    f.write(f'Client CPU time per request: mean {cpu.mean()} seconds{os.linesep}')
+    f.write(f'Throughput: {throughput["megabytesPerSecond"]} MB/s{os.linesep}')
+    if records:
+      f.write(f'Throughput: {throughput["recordsPerSecond"]} records/s{os.linesep}')
+    f.write(f'Total time: {total_time} seconds{os.linesep}')
   logging.info(f'Written out {results_file}.')
+  results = {
+    'format': extension[1:],
+    'mediaType': media_type,
+    'size': file_size,
+    'bytes': file_bytes,
+    'records': records,
+    'iterations': iterations,
+    'warmup': timing.get('warmup', 0),
+    'coefficientOfVariation': coefficient_of_variation(times),
+    'concurrency': 1,
+    'compression': compression,
+    'totalTime': total_time,
+    'latency': latency.summary(),
+    'throughput': throughput,
+    'phases': {name: histogram.summary() for name, histogram in phases.items()},
+    'transfer': transfer,
+    'cpuTime': cpu.summary(),
+    'histogram': latency.to_dict(),
+    'phaseHistograms': {name: histogram.to_dict() for name, histogram in phases.items()},
+    'host': host_metadata()
+  }
+  write_results(folder_name, results)
+  return results
+
+
+def host_metadata():
+  return {
+    'client': socket.gethostname(),
+    'platform': platform.platform(),
+    'python': platform.python_version(),
+    'cpus': multiprocessing.cpu_count(),
+    'server': host
+  }
+
+
+# Flattens nested result dicts into 'a.b' keyed columns for the csv results file.
+def flatten(data, prefix=''):
+  flat = {}
+  for key, value in data.items():
+    if isinstance(value, dict):
+      flat.update(flatten(value, f'{prefix}{key}.'))
+    else:
+      flat[f'{prefix}{key}'] = value
+  return flat
+
+
+# Writes a structured copy of the results as benchmarks.json and benchmarks.csv. The results
+# can be a single dict, or a list of dicts (e.g. one per sweep level) written as csv rows.
+# Histograms are left out of the csv since they only make sense merged.
+def write_results(folder_name, results, name='benchmarks'):
+  os.makedirs(folder_name, exist_ok=True)
+  json_file = f'{folder_name}/{name}.json'
+  with open(json_file, 'w') as f:
+    json.dump(results, f, indent=2)
+  rows = [flatten({key: value for key, value in result.items()
+                   if key not in ('histogram', 'phaseHistograms')})
+          for result in (results if isinstance(results, list) else [results])]
+  fieldnames = list(dict.fromkeys(key for row in rows for key in row))
+  csv_file = f'{folder_name}/{name}.csv'
+  with open(csv_file, 'w', newline='') as f:
+    writer = csv.DictWriter(f, fieldnames=fieldnames)
+    writer.writeheader()
+    writer.writerows(rows)
+  logging.info(f'Written out {json_file} and {csv_file}.')
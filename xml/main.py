@@ -12,6 +12,7 @@ sys.path.append(parent_dir)
 
 from setup import setup, teardown, file_mask_context_name, file_search_context_name
 
+import generator
 import utils
 
 if __name__ == '__main__':
@@ -19,37 +20,24 @@ if __name__ == '__main__':
   parser = argparse.ArgumentParser(description='Benchmark xml file search/masking.')
   parser.add_argument('file_size', type=int, help='The size of the xml file in kbs.')
   parser.add_argument('-i', '--iterations', metavar='N', type=int, default=10, help='The number of times the test should be run to obtain the average. Defaults to 10.')
+  parser.add_argument('--generate-processes', metavar='N', type=int, default=1, help='The number of processes used to create the test file. Defaults to 1.')
+  utils.add_benchmark_arguments(parser)
   
   args = parser.parse_args()
   file_size = args.file_size
   iterations = args.iterations
-  test_folder = 'test-files'
-  file_name = f'test-{file_size}.xml'
-  file_path = f'{test_folder}/{file_name}'
-  os.makedirs(test_folder, exist_ok=True)
-  if not os.path.exists(file_path):
-    logging.info(f'Creating {file_name}...')
-    with open(file_path, 'w') as f:
-      header = f'<?xml version="1.0" encoding="UTF-8"?>{os.linesep}'
-      open_tag = f'<div>{os.linesep}'
-      close_tag = f'</div>{os.linesep}'
-      test_line = f'    <div>This is a test</div>{os.linesep}'
-      initial_size = len(header) + len(open_tag) + len(close_tag)
-      num_tags = int((file_size - initial_size) * 1000 / len(test_line))
-      f.write(header)
-      f.write(open_tag)
-      for i in range(num_tags):
-        f.write(test_line)
-      f.write(close_tag)
-    logging.info(f'Created {file_name}.')
+  file_path = generator.test_file('xml', file_size, args.generate_processes)
   with requests.Session() as session:
+    cache = utils.context_cache(session, args)
     try:
-      setup(session)
+      setup(session, cache)
       context = json.dumps({
           "fileSearchContextName": file_search_context_name,
           "fileMaskContextName": file_mask_context_name
       })
       utils.benchmark_search_mask(session, file_path, context, 
-                                  file_size, 'application/xml', iterations)
+                                  file_size, 'application/xml', iterations,
+                                  records=generator.layouts['xml'](file_size).records,
+                                  **utils.benchmark_options(args))
     finally:
-      teardown(session)
+      teardown(session, cache)